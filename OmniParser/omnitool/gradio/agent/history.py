@@ -0,0 +1,138 @@
+"""
+Incremental message-history compaction for the VLM agents.
+
+HistoryManager replaces the per-step full rescans done by
+`_remove_som_images` / `_maybe_filter_to_n_most_recent_images`: it only looks
+at messages appended since the previous step, keeps a ring buffer of where the
+surviving images live, and keeps a running text-token estimate that it brings
+back under budget by compacting the oldest tool chatter.
+"""
+from collections import deque
+
+from agent.llm_utils.utils import is_image_path
+
+CHARS_PER_TOKEN = 4         # rough estimate, good enough for budgeting
+SUMMARY_CHARS = 200         # text kept from a compacted message
+
+
+def _is_image(cnt) -> bool:
+    return (isinstance(cnt, str) and is_image_path(cnt)) or (isinstance(cnt, dict) and cnt.get("type") == "image")
+
+
+def _text_tokens(cnt) -> int:
+    if _is_image(cnt):
+        return 0
+    if isinstance(cnt, dict) and cnt.get("type") == "tool_result":
+        return sum(_text_tokens(c) for c in cnt.get("content", []))
+    return len(str(cnt)) // CHARS_PER_TOKEN
+
+
+class HistoryManager:
+    """
+    Keeps the conversation passed to the VLM bounded, mutating `messages` in place.
+
+    - At most `max_images` screenshots stay in the history (None = no limit);
+      older ones are dropped oldest-first.
+    - Images added with `ephemeral=` (the SoM overlay) are dropped at the next step.
+    - When the estimated text tokens exceed `token_budget`, the oldest messages
+      outside the first `keep_head` and the last `keep_tail` are cut down to a
+      short summary, one message at a time and each at most once.
+
+    Each message is indexed once, when first seen, so a step costs O(new
+    messages) rather than O(history).
+    """
+
+    def __init__(
+        self,
+        max_images: int | None = None,
+        token_budget: int = 32_000,
+        keep_head: int = 1,
+        keep_tail: int = 6,
+    ):
+        self.max_images = max_images
+        self.token_budget = token_budget
+        self.keep_head = keep_head
+        self.keep_tail = keep_tail
+        self._images: deque = deque()      # (container list, item), oldest first
+        self._ephemeral: list = []         # (container list, item) to drop next step
+        self._tokens: list[int] = []       # text-token estimate per indexed message
+        self.total_tokens = 0
+        self._compact_from = keep_head     # messages before this index are compacted or kept
+        self._seen = 0
+
+    def prepare(self, messages: list) -> list:
+        """Index new messages and enforce the image and token limits; returns `messages`."""
+        for container, item in self._ephemeral:
+            _discard(container, item)
+        self._ephemeral.clear()
+
+        for msg in messages[self._seen:]:
+            self._index(msg)
+        self._seen = len(messages)
+
+        if self.max_images is not None:
+            while len(self._images) > self.max_images:
+                _discard(*self._images.popleft())
+
+        while self.total_tokens > self.token_budget and self._compact_from < len(messages) - self.keep_tail:
+            self._compact(messages, self._compact_from)
+            self._compact_from += 1
+        return messages
+
+    def add_images(self, messages: list, images: list[str], ephemeral: list[str] = ()) -> None:
+        """Append this step's screenshot paths to the last message and track them."""
+        if not messages or not isinstance(messages[-1], dict):
+            return
+        last = messages[-1]
+        if not isinstance(last["content"], list):
+            last["content"] = [last["content"]]
+        content = last["content"]
+        for path in images:
+            content.append(path)
+            self._images.append((content, path))
+        for path in ephemeral:
+            content.append(path)
+            self._ephemeral.append((content, path))
+
+    def _index(self, msg) -> None:
+        tokens = 0
+        if isinstance(msg, dict):
+            if not isinstance(msg.get("content"), list):
+                msg["content"] = [msg.get("content", "")]
+            content = msg["content"]
+            for cnt in content:
+                if isinstance(cnt, str) and is_image_path(cnt) and "som" in cnt:
+                    self._ephemeral.append((content, cnt))  # stale SoM overlay from the caller
+                elif _is_image(cnt):
+                    self._images.append((content, cnt))
+                elif isinstance(cnt, dict) and cnt.get("type") == "tool_result":
+                    for entry in cnt.get("content", []):
+                        if _is_image(entry):
+                            self._images.append((cnt["content"], entry))
+                tokens += _text_tokens(cnt)
+        else:
+            tokens = len(str(msg)) // CHARS_PER_TOKEN
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def _compact(self, messages: list, idx: int) -> None:
+        msg = messages[idx]
+        if not isinstance(msg, dict):
+            return
+        content = msg["content"]
+        text = " ".join(str(c) for c in content if not _is_image(c) and not isinstance(c, dict))
+        if len(text) <= SUMMARY_CHARS:
+            return
+        summary = f"[earlier {msg.get('role', 'message')}, truncated] {text[:SUMMARY_CHARS]}…"
+        # in place, so the ring buffer's references into this list stay valid
+        content[:] = [summary] + [c for c in content if _is_image(c) or isinstance(c, dict)]
+        new_tokens = sum(_text_tokens(c) for c in content)
+        self.total_tokens += new_tokens - self._tokens[idx]
+        self._tokens[idx] = new_tokens
+
+
+def _discard(container: list, item) -> None:
+    for i, cnt in enumerate(container):
+        if cnt is item:
+            del container[i]
+            return
@@ -2,12 +2,29 @@ import os
 import logging
 import base64
 import requests
-from .utils import is_image_path, encode_image
+from .utils import is_image_path, encode_image, image_mime_type
+
+# Downscaling that matches what each provider does to images anyway, so fewer
+# bytes are encoded and uploaded: OpenAI fits images into 2048px then 768px on
+# the short side; Qwen-VL caps the area at 1280 28x28 patches.
+PROVIDER_IMAGE_LIMITS = {
+    "api.openai.com": {"max_side": 2048, "max_short_side": 768},
+    "dashscope": {"max_pixels": 1280 * 28 * 28},
+}
+
+
+def _image_limits(provider_base_url: str) -> dict:
+    for host, limits in PROVIDER_IMAGE_LIMITS.items():
+        if host in provider_base_url:
+            return limits
+    return {}
+
 
 def run_oai_interleaved(messages: list, system: str, model_name: str, api_key: str, max_tokens=256, temperature=0, provider_base_url: str = "https://api.openai.com/v1"):    
     headers = {"Content-Type": "application/json",
                "Authorization": f"Bearer {api_key}"}
     final_messages = [{"role": "system", "content": system}]
+    image_limits = _image_limits(provider_base_url)
 
     if type(messages) == list:
         for item in messages:
@@ -17,8 +34,8 @@ def run_oai_interleaved(messages: list, system: str, model_name: str, api_key: s
                     if isinstance(cnt, str):
                         if is_image_path(cnt) and 'o3-mini' not in model_name:
                             # 03 mini does not support images
-                            base64_image = encode_image(cnt)
-                            content = {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                            base64_image = encode_image(cnt, **image_limits)
+                            content = {"type": "image_url", "image_url": {"url": f"data:{image_mime_type(cnt)};base64,{base64_image}"}}
                         else:
                             content = {"type": "text", "text": cnt}
                     else:
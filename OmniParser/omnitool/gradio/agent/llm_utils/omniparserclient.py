@@ -1,7 +1,7 @@
-import requests
 import base64
 from pathlib import Path
 from tools.screen_capture import get_screenshot
+from tools.transport import transport
 from agent.llm_utils.utils import encode_image
 
 OUTPUT_DIR = "./tmp/outputs"
@@ -11,11 +11,12 @@ class OmniParserClient:
                  url: str) -> None:
         self.url = url
 
-    def __call__(self,):
-        screenshot, screenshot_path = get_screenshot()
+    def __call__(self, prefetched=None):
+        """Parse the current screen; `prefetched` is an already captured (screenshot, path)."""
+        screenshot, screenshot_path = prefetched or get_screenshot()
         screenshot_path = str(screenshot_path)
         image_base64 = encode_image(screenshot_path)
-        response = requests.post(self.url, json={"base64_image": image_base64})
+        response = transport.post(self.url, json={"base64_image": image_base64})
         response_json = response.json()
         print('omniparser latency:', response_json['latency'])
 
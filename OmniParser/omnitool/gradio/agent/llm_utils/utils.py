@@ -1,4 +1,10 @@
 import base64
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
 
 def is_image_path(text):
     image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif")
@@ -7,7 +13,56 @@ def is_image_path(text):
     else:
         return False
 
-def encode_image(image_path):
-    """Encode image file to base64."""
+def image_mime_type(image_path):
+    """Return the MIME type matching an image path's extension."""
+    ext = image_path.rsplit(".", 1)[-1].lower()
+    return {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif",
+            "bmp": "image/bmp", "tiff": "image/tiff", "tif": "image/tiff", "webp": "image/webp"}.get(ext, "image/png")
+
+# (path, mtime_ns, size, max_side, max_short_side, max_pixels) → base64 payload.
+# Screenshots stay in the history for several steps; each version of a file
+# is read and encoded once per size variant.
+_ENCODE_CACHE_SIZE = 16
+_encode_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_encode_lock = threading.Lock()
+
+
+def _scaled_size(w, h, max_side=None, max_short_side=None, max_pixels=None):
+    scale = 1.0
+    if max_side and max(w, h) > max_side:
+        scale = min(scale, max_side / max(w, h))
+    if max_short_side and min(w, h) * scale > max_short_side:
+        scale = min(scale, max_short_side / min(w, h))
+    if max_pixels and w * h * scale * scale > max_pixels:
+        scale = min(scale, (max_pixels / (w * h)) ** 0.5)
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+def encode_image(image_path, max_side=None, max_short_side=None, max_pixels=None):
+    """
+    Encode image file to base64, optionally downscaled so it fits the limits
+    (same format as the file). Results are cached per file version and variant.
+    """
+    st = os.stat(image_path)
+    key = (str(image_path), st.st_mtime_ns, st.st_size, max_side, max_short_side, max_pixels)
+    with _encode_lock:
+        if key in _encode_cache:
+            _encode_cache.move_to_end(key)
+            return _encode_cache[key]
+
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
\ No newline at end of file
+        data = image_file.read()
+    if max_side or max_short_side or max_pixels:
+        with Image.open(BytesIO(data)) as img:
+            size = _scaled_size(*img.size, max_side, max_short_side, max_pixels)
+            if size != img.size:
+                buf = BytesIO()
+                img.resize(size, Image.LANCZOS).save(buf, format=img.format)
+                data = buf.getvalue()
+    encoded = base64.b64encode(data).decode("utf-8")
+
+    with _encode_lock:
+        _encode_cache[key] = encoded
+        while len(_encode_cache) > _ENCODE_CACHE_SIZE:
+            _encode_cache.popitem(last=False)
+    return encoded
\ No newline at end of file
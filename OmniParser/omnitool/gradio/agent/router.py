@@ -0,0 +1,183 @@
+"""
+Cost- and latency-aware model routing for the VLM agents.
+
+Every step first goes to a small, fast model. Its answer is accepted when the
+decision is cheap to verify: a wait/scroll, or a Box ID that exists and whose
+label is unique on screen. Anything else escalates the step to the large
+model. Those are unparsable output, a missing or out-of-range box, an
+ambiguous label, a repeat of the previous action (a likely loop), and
+"None" (declaring the task finished, the costliest call to get wrong). Per-model
+latency and cost histograms are kept, and a per-task budget is enforced.
+"""
+import bisect
+import json
+
+# USD per 1M tokens. The clients only report total tokens, so these are the
+# input prices, as the per-model constants in VLMAgent were.
+PRICING_PER_MTOK = {
+    "gpt-4o-2024-11-20": 2.5,   # https://openai.com/api/pricing/
+    "gpt-4o-mini": 0.15,
+    "o1": 15,
+    "o3-mini": 1.1,
+    "deepseek-r1-distill-llama-70b": 0.99,
+    "qwen2.5-vl-72b-instruct": 2.2,
+}
+
+# large model → small model tried first
+CASCADES = {
+    "gpt-4o-2024-11-20": "gpt-4o-mini",
+    "o1": "o3-mini",
+}
+
+# actions that need no element, so the small model cannot pick a wrong one
+# ("None", ending the task, is deliberately not here: completion always goes
+# to the large model)
+NO_TARGET_ACTIONS = {"wait", "scroll_up", "scroll_down"}
+
+LATENCY_BUCKETS_S = (0.5, 1, 2, 4, 8, 16, 32)
+COST_BUCKETS_USD = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05)
+
+
+class BudgetExceeded(Exception):
+    """The task has spent its budget; no further model calls are made."""
+
+
+def cost_usd(model: str, tokens: int) -> float:
+    return tokens * PRICING_PER_MTOK.get(model, 0.0) / 1_000_000
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is "above the top bound"
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def as_dict(self) -> dict:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {"buckets": dict(zip(labels, self.counts)), "total": round(self.total, 6)}
+
+
+class ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+        self.latency = Histogram(LATENCY_BUCKETS_S)
+        self.cost = Histogram(COST_BUCKETS_USD)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "tokens": self.tokens,
+            "latency_s": self.latency.as_dict(),
+            "cost_usd": self.cost.as_dict(),
+        }
+
+
+class ModelRouter:
+    """
+    Picks the model for each step and records what every call cost.
+
+    With `small=None` every step goes to `large` and the router only keeps
+    statistics and enforces `task_budget_usd`. Once the budget is spent,
+    `check_budget` raises BudgetExceeded. Past `small_only_at` of the budget,
+    steps are no longer escalated.
+    """
+
+    def __init__(self, large: str, small: str | None = None, task_budget_usd: float | None = None,
+                 small_only_at: float = 0.8):
+        self.large = large
+        self.small = small
+        self.task_budget_usd = task_budget_usd
+        self.small_only_at = small_only_at
+        self.spent_usd = 0.0
+        self.stats: dict[str, ModelStats] = {}
+        self.routed = {"small": 0, "large": 0, "escalated": 0}
+        self._last_action = None
+        self._force_large = False
+
+    def check_budget(self):
+        if self.task_budget_usd is not None and self.spent_usd >= self.task_budget_usd:
+            raise BudgetExceeded(f"task budget ${self.task_budget_usd:.4f} spent (${self.spent_usd:.4f})")
+
+    def _budget_tight(self) -> bool:
+        return self.task_budget_usd is not None and self.spent_usd >= self.small_only_at * self.task_budget_usd
+
+    def choose(self) -> str:
+        """Model to ask first for this step."""
+        self.check_budget()
+        if self.small is None or (self._force_large and not self._budget_tight()):
+            self.routed["large"] += 1
+            return self.large
+        self.routed["small"] += 1
+        return self.small
+
+    def record(self, model: str, latency_s: float, tokens: int) -> float:
+        """Account one call; returns its cost in USD."""
+        cost = cost_usd(model, tokens)
+        stats = self.stats.setdefault(model, ModelStats())
+        stats.calls += 1
+        stats.tokens += tokens
+        stats.latency.add(latency_s)
+        stats.cost.add(cost)
+        self.spent_usd += cost
+        return cost
+
+    def review(self, model: str, response_json: dict | None, parsed_screen: dict) -> str | None:
+        """
+        Returns why the small model's answer should be escalated, or None to
+        accept it. Answers from the large model are always accepted.
+        """
+        if model != self.small or self._budget_tight():
+            return None
+        if response_json is None:
+            return "unparsable response"
+        action = response_json.get("Next Action")
+        if action in NO_TARGET_ACTIONS:
+            return None
+        elements = parsed_screen.get("parsed_content_list", [])
+        if action == "None":
+            return "task completion"
+        try:
+            box = int(response_json["Box ID"])
+            if box < 0:      # would index from the end of the list
+                raise IndexError(box)
+            label = elements[box]["content"]
+        except (KeyError, ValueError, TypeError, IndexError):
+            return "missing or unknown Box ID"
+        if sum(e.get("content") == label for e in elements) > 1:
+            return f"ambiguous target {label!r}"
+        if (action, box) == self._last_action:
+            return "repeated previous action"
+        return None
+
+    def escalate(self) -> str:
+        self.routed["escalated"] += 1
+        return self.large
+
+    def accept(self, response_json: dict | None):
+        """Remember the step's final decision; a repeated action sends the next step to the large model."""
+        action = None
+        if response_json:
+            box = response_json.get("Box ID")
+            try:
+                box = int(box)
+            except (TypeError, ValueError):
+                pass
+            action = (response_json.get("Next Action"), box)
+        self._force_large = action is not None and action == self._last_action
+        self._last_action = action
+
+    def summary(self) -> dict:
+        return {
+            "spent_usd": round(self.spent_usd, 6),
+            "budget_usd": self.task_budget_usd,
+            "routed": dict(self.routed),
+            "models": {m: s.as_dict() for m, s in self.stats.items()},
+        }
+
+    def __str__(self):
+        return json.dumps(self.summary())
@@ -8,11 +8,12 @@ from io import BytesIO
 
 from anthropic import APIResponse
 from anthropic.types import ToolResultBlockParam
-from anthropic.types.beta import BetaMessage, BetaTextBlock, BetaToolUseBlock, BetaMessageParam, BetaUsage
+from anthropic.types.beta import BetaMessage, BetaTextBlock, BetaToolUseBlock, BetaUsage
 
 from agent.llm_utils.oaiclient import run_oai_interleaved
 from agent.llm_utils.groqclient import run_groq_interleaved
-from agent.llm_utils.utils import is_image_path
+from agent.history import HistoryManager
+from agent.router import CASCADES, BudgetExceeded, ModelRouter
 import time
 import re
 
@@ -27,6 +28,14 @@ def extract_data(input_string, data_type):
     # Return the first match if exists, trimming whitespace and ignoring potential closing backticks
     return matches[0][0].strip() if matches else input_string
 
+def _parse_response(vlm_response: str) -> dict | None:
+    """The action JSON from a VLM reply, or None if it does not parse."""
+    try:
+        parsed = json.loads(extract_data(vlm_response, "json"))
+    except (json.JSONDecodeError, TypeError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
 class VLMAgent:
     def __init__(
         self,
@@ -38,6 +47,8 @@ class VLMAgent:
         max_tokens: int = 4096,
         only_n_most_recent_images: int | None = None,
         print_usage: bool = True,
+        routing: bool = False,
+        task_budget_usd: float | None = None,
     ):
         if model == "omniparser + gpt-4o":
             self.model = "gpt-4o-2024-11-20"
@@ -58,6 +69,13 @@ class VLMAgent:
         self.api_response_callback = api_response_callback
         self.max_tokens = max_tokens
         self.only_n_most_recent_images = only_n_most_recent_images
+        self.history = HistoryManager(max_images=only_n_most_recent_images)
+        # with routing, steps go to CASCADES[self.model] first and escalate to self.model
+        self.router = ModelRouter(
+            large=self.model,
+            small=CASCADES.get(self.model) if routing else None,
+            task_budget_usd=task_budget_usd,
+        )
         self.output_callback = output_callback
 
         self.print_usage = print_usage
@@ -80,71 +98,41 @@ class VLMAgent:
         system = self._get_system_prompt(boxids_and_labels)
 
         # drop looping actions msg, byte image etc
-        planner_messages = messages
-        _remove_som_images(planner_messages)
-        _maybe_filter_to_n_most_recent_images(planner_messages, self.only_n_most_recent_images)
-
-        if isinstance(planner_messages[-1], dict):
-            if not isinstance(planner_messages[-1]["content"], list):
-                planner_messages[-1]["content"] = [planner_messages[-1]["content"]]
-            planner_messages[-1]["content"].append(f"{OUTPUT_DIR}/screenshot_{screenshot_uuid}.png")
-            planner_messages[-1]["content"].append(f"{OUTPUT_DIR}/screenshot_som_{screenshot_uuid}.png")
+        planner_messages = self.history.prepare(messages)
+        self.history.add_images(
+            planner_messages,
+            [f"{OUTPUT_DIR}/screenshot_{screenshot_uuid}.png"],
+            ephemeral=[f"{OUTPUT_DIR}/screenshot_som_{screenshot_uuid}.png"],
+        )
 
         start = time.time()
-        if "gpt" in self.model or "o1" in self.model or "o3-mini" in self.model:
-            vlm_response, token_usage = run_oai_interleaved(
-                messages=planner_messages,
-                system=system,
-                model_name=self.model,
-                api_key=self.api_key,
-                max_tokens=self.max_tokens,
-                provider_base_url="https://api.openai.com/v1",
-                temperature=0,
-            )
-            print(f"oai token usage: {token_usage}")
-            self.total_token_usage += token_usage
-            if 'gpt' in self.model:
-                self.total_cost += (token_usage * 2.5 / 1000000)  # https://openai.com/api/pricing/
-            elif 'o1' in self.model:
-                self.total_cost += (token_usage * 15 / 1000000)  # https://openai.com/api/pricing/
-            elif 'o3-mini' in self.model:
-                self.total_cost += (token_usage * 1.1 / 1000000)  # https://openai.com/api/pricing/
-        elif "r1" in self.model:
-            vlm_response, token_usage = run_groq_interleaved(
-                messages=planner_messages,
-                system=system,
-                model_name=self.model,
-                api_key=self.api_key,
-                max_tokens=self.max_tokens,
-            )
-            print(f"groq token usage: {token_usage}")
-            self.total_token_usage += token_usage
-            self.total_cost += (token_usage * 0.99 / 1000000)
-        elif "qwen" in self.model:
-            vlm_response, token_usage = run_oai_interleaved(
-                messages=planner_messages,
-                system=system,
-                model_name=self.model,
-                api_key=self.api_key,
-                max_tokens=min(2048, self.max_tokens),
-                provider_base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-                temperature=0,
-            )
-            print(f"qwen token usage: {token_usage}")
-            self.total_token_usage += token_usage
-            self.total_cost += (token_usage * 2.2 / 1000000)  # https://help.aliyun.com/zh/model-studio/getting-started/models?spm=a2c4g.11186623.0.0.74b04823CGnPv7#fe96cfb1a422a
-        else:
-            raise ValueError(f"Model {self.model} not supported")
+        try:
+            model = self.router.choose()
+            vlm_response = self._run_model(model, planner_messages, system)
+            vlm_response_json = _parse_response(vlm_response)
+            reason = self.router.review(model, vlm_response_json, parsed_screen)
+            if reason:
+                # the small model's answer is not safe to act on; ask the large one
+                print(f"Escalating step {self.step_count} from {model}: {reason}")
+                model = self.router.escalate()
+                vlm_response = self._run_model(model, planner_messages, system)
+                vlm_response_json = _parse_response(vlm_response)
+            self.router.accept(vlm_response_json)
+        except BudgetExceeded as e:
+            model = "none"
+            vlm_response = str(e)
+            vlm_response_json = {"Reasoning": f"Stopping: {e}", "Next Action": "None"}
         latency_vlm = time.time() - start
-        self.output_callback(f"LLM: {latency_vlm:.2f}s, OmniParser: {latency_omniparser:.2f}s", sender="bot")
+        self.output_callback(f"LLM ({model}): {latency_vlm:.2f}s, OmniParser: {latency_omniparser:.2f}s", sender="bot")
 
         print(f"{vlm_response}")
         
         if self.print_usage:
             print(f"Total token so far: {self.total_token_usage}. Total cost so far: $USD{self.total_cost:.5f}")
-        
-        vlm_response_json = extract_data(vlm_response, "json")
-        vlm_response_json = json.loads(vlm_response_json)
+            print(f"Routing: {self.router}")
+
+        if vlm_response_json is None:
+            raise ValueError(f"VLM response is not valid JSON: {vlm_response}")
 
         img_to_show_base64 = parsed_screen["som_image_base64"]
         if "Box ID" in vlm_response_json:
@@ -204,6 +192,49 @@ class VLMAgent:
         response_message = BetaMessage(id=f'toolu_{uuid.uuid4()}', content=response_content, model='', role='assistant', type='message', stop_reason='tool_use', usage=BetaUsage(input_tokens=0, output_tokens=0))
         return response_message, vlm_response_json
 
+    def _run_model(self, model: str, messages: list, system: str) -> str:
+        """One VLM call; latency, tokens and cost are recorded with the router."""
+        start = time.time()
+        if "gpt" in model or "o1" in model or "o3-mini" in model:
+            vlm_response, token_usage = run_oai_interleaved(
+                messages=messages,
+                system=system,
+                model_name=model,
+                api_key=self.api_key,
+                max_tokens=self.max_tokens,
+                provider_base_url="https://api.openai.com/v1",
+                temperature=0,
+            )
+            print(f"oai token usage: {token_usage}")
+            self.total_token_usage += token_usage
+        elif "r1" in model:
+            vlm_response, token_usage = run_groq_interleaved(
+                messages=messages,
+                system=system,
+                model_name=model,
+                api_key=self.api_key,
+                max_tokens=self.max_tokens,
+            )
+            print(f"groq token usage: {token_usage}")
+            self.total_token_usage += token_usage
+        elif "qwen" in model:
+            vlm_response, token_usage = run_oai_interleaved(
+                messages=messages,
+                system=system,
+                model_name=model,
+                api_key=self.api_key,
+                max_tokens=min(2048, self.max_tokens),
+                provider_base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+                temperature=0,
+            )
+            print(f"qwen token usage: {token_usage}")
+            self.total_token_usage += token_usage
+        else:
+            raise ValueError(f"Model {model} not supported")
+        latency = time.time() - start
+        self.total_cost += self.router.record(model, latency, token_usage)
+        return vlm_response
+
     def _api_response_callback(self, response: APIResponse):
         self.api_response_callback(response)
 
@@ -292,62 +323,3 @@ IMPORTANT NOTES:
 """ 
 
         return main_section
-
-def _remove_som_images(messages):
-    for msg in messages:
-        msg_content = msg["content"]
-        if isinstance(msg_content, list):
-            msg["content"] = [
-                cnt for cnt in msg_content 
-                if not (isinstance(cnt, str) and 'som' in cnt and is_image_path(cnt))
-            ]
-
-
-def _maybe_filter_to_n_most_recent_images(
-    messages: list[BetaMessageParam],
-    images_to_keep: int,
-    min_removal_threshold: int = 10,
-):
-    """
-    With the assumption that images are screenshots that are of diminishing value as
-    the conversation progresses, remove all but the final `images_to_keep` tool_result
-    images in place
-    """
-    if images_to_keep is None:
-        return messages
-
-    total_images = 0
-    for msg in messages:
-        for cnt in msg.get("content", []):
-            if isinstance(cnt, str) and is_image_path(cnt):
-                total_images += 1
-            elif isinstance(cnt, dict) and cnt.get("type") == "tool_result":
-                for content in cnt.get("content", []):
-                    if isinstance(content, dict) and content.get("type") == "image":
-                        total_images += 1
-
-    images_to_remove = total_images - images_to_keep
-    
-    for msg in messages:
-        msg_content = msg["content"]
-        if isinstance(msg_content, list):
-            new_content = []
-            for cnt in msg_content:
-                # Remove images from SOM or screenshot as needed
-                if isinstance(cnt, str) and is_image_path(cnt):
-                    if images_to_remove > 0:
-                        images_to_remove -= 1
-                        continue
-                # VLM shouldn't use anthropic screenshot tool so shouldn't have these but in case it does, remove as needed
-                elif isinstance(cnt, dict) and cnt.get("type") == "tool_result":
-                    new_tool_result_content = []
-                    for tool_result_entry in cnt.get("content", []):
-                        if isinstance(tool_result_entry, dict) and tool_result_entry.get("type") == "image":
-                            if images_to_remove > 0:
-                                images_to_remove -= 1
-                                continue
-                        new_tool_result_content.append(tool_result_entry)
-                    cnt["content"] = new_tool_result_content
-                # Append fixed content to current message's content list
-                new_content.append(cnt)
-            msg["content"] = new_content
\ No newline at end of file
@@ -1,20 +1,20 @@
 import json
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from typing import cast, Callable
 import uuid
 from PIL import Image, ImageDraw
 import base64
 from io import BytesIO
-import copy
 from pathlib import Path
 from datetime import datetime
 from anthropic import APIResponse
 from anthropic.types import ToolResultBlockParam
-from anthropic.types.beta import BetaMessage, BetaTextBlock, BetaToolUseBlock, BetaMessageParam, BetaUsage
+from anthropic.types.beta import BetaMessage, BetaTextBlock, BetaToolUseBlock, BetaUsage
 
 from agent.llm_utils.oaiclient import run_oai_interleaved
 from agent.llm_utils.groqclient import run_groq_interleaved
-from agent.llm_utils.utils import is_image_path
+from agent.history import HistoryManager
 import time
 import re
 import os
@@ -62,6 +62,27 @@ def extract_data(input_string, data_type):
     # Return the first match if exists, trimming whitespace and ignoring potential closing backticks
     return matches[0][0].strip() if matches else input_string
 
+def parse_ledger(ledger: str):
+    """
+    The progress ledger as a dict, or None if it is not JSON. Accepts a fenced
+    ```json block (see extract_data) or a bare object with text around it.
+    """
+    text = extract_data(ledger, "json")
+    try:
+        return json.loads(text)
+    except ValueError:
+        start, end = text.find("{"), text.rfind("}")
+        if 0 <= start < end:
+            try:
+                return json.loads(text[start:end + 1])
+            except ValueError:
+                pass
+    return None
+
+# ledger updates for every orchestrated agent in the process; each agent has
+# at most one in flight, and threads are only started when first needed
+_ledger_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ledger")
+
 class VLMOrchestratedAgent:
     def __init__(
         self,
@@ -94,6 +115,7 @@ class VLMOrchestratedAgent:
         self.api_response_callback = api_response_callback
         self.max_tokens = max_tokens
         self.only_n_most_recent_images = only_n_most_recent_images
+        self.history = HistoryManager(max_images=only_n_most_recent_images, keep_head=2)
         self.output_callback = output_callback
         self.save_folder = save_folder
         
@@ -106,24 +128,16 @@ class VLMOrchestratedAgent:
         self.system = ''
     
     def __call__(self, messages: list, parsed_screen: list[str, list, dict]):
+        ledger_future = None
         if self.step_count == 0:
             plan = self._initialize_task(messages)
             self.output_callback(f'-- Plan: {plan} --', )
             # update messages with the plan
             messages.append({"role": "assistant", "content": plan})
         else:
-            updated_ledger = self._update_ledger(messages)
-            self.output_callback(
-                f'<details>'
-                f'  <summary><strong>Task Progress Ledger (click to expand)</strong></summary>'
-                f'  <div style="padding: 10px; background-color: #f8f9fa; border-radius: 5px; margin-top: 5px;">'
-                f'    <pre>{updated_ledger}</pre>'
-                f'  </div>'
-                f'</details>',
-            )
-            # update messages with the ledger
-            messages.append({"role": "assistant", "content": updated_ledger})
-            self.ledger = updated_ledger
+            # the ledger only reads the history up to the previous step, so it is
+            # requested alongside the next action and reconciled once both return
+            ledger_future = _ledger_pool.submit(self._update_ledger, _snapshot(messages))
 
         self.step_count += 1
         # save the image to the output folder
@@ -141,15 +155,12 @@ class VLMOrchestratedAgent:
         system = self._get_system_prompt(boxids_and_labels)
 
         # drop looping actions msg, byte image etc
-        planner_messages = messages
-        _remove_som_images(planner_messages)
-        _maybe_filter_to_n_most_recent_images(planner_messages, self.only_n_most_recent_images)
-
-        if isinstance(planner_messages[-1], dict):
-            if not isinstance(planner_messages[-1]["content"], list):
-                planner_messages[-1]["content"] = [planner_messages[-1]["content"]]
-            planner_messages[-1]["content"].append(f"{OUTPUT_DIR}/screenshot_{screenshot_uuid}.png")
-            planner_messages[-1]["content"].append(f"{OUTPUT_DIR}/screenshot_som_{screenshot_uuid}.png")
+        planner_messages = self.history.prepare(messages)
+        self.history.add_images(
+            planner_messages,
+            [f"{OUTPUT_DIR}/screenshot_{screenshot_uuid}.png"],
+            ephemeral=[f"{OUTPUT_DIR}/screenshot_som_{screenshot_uuid}.png"],
+        )
 
         start = time.time()
         if "gpt" in self.model or "o1" in self.model or "o3-mini" in self.model:
@@ -209,6 +220,11 @@ class VLMOrchestratedAgent:
         vlm_response_json = extract_data(vlm_response, "json")
         vlm_response_json = json.loads(vlm_response_json)
 
+        if ledger_future is not None:
+            ledger_wait = time.time()
+            self._apply_ledger(messages, ledger_future.result(), vlm_response_json)
+            print(f"ledger ready {time.time() - ledger_wait:.2f}s after the action")
+
         img_to_show_base64 = parsed_screen["som_image_base64"]
         if "Box ID" in vlm_response_json:
             try:
@@ -379,8 +395,8 @@ IMPORTANT NOTES:
         self._task = messages[0]["content"]
         # make a plan
         plan_prompt = self._get_plan_prompt(self._task)
-        input_message = copy.deepcopy(messages)
-        input_message.append({"role": "user", "content": plan_prompt})
+        # run_oai_interleaved only reads the messages, so a shallow copy is enough
+        input_message = [*messages, {"role": "user", "content": plan_prompt}]
         vlm_response, token_usage = run_oai_interleaved(
                 messages=input_message,
                 system="",
@@ -406,13 +422,41 @@ IMPORTANT NOTES:
         
         return plan
 
+    def _apply_ledger(self, messages: list, updated_ledger: str, vlm_response_json: dict):
+        """
+        Show the ledger and record it in the history. If it reports the request
+        as satisfied, the action chosen in parallel is replaced by "None".
+        """
+        self.output_callback(
+            f'<details>'
+            f'  <summary><strong>Task Progress Ledger (click to expand)</strong></summary>'
+            f'  <div style="padding: 10px; background-color: #f8f9fa; border-radius: 5px; margin-top: 5px;">'
+            f'    <pre>{updated_ledger}</pre>'
+            f'  </div>'
+            f'</details>',
+        )
+        # update messages with the ledger
+        messages.append({"role": "assistant", "content": updated_ledger})
+        self.ledger = updated_ledger
+
+        ledger = parse_ledger(updated_ledger)
+        try:
+            answer = ledger["is_request_satisfied"]["answer"]
+        except (KeyError, TypeError):
+            print(f"Error parsing ledger, treating the request as not satisfied: {updated_ledger}")
+            answer = False
+        satisfied = answer is True or str(answer).strip().lower() == "true"
+        if satisfied and vlm_response_json.get("Next Action") != "None":
+            print(f"Ledger reports the request satisfied; dropping action {vlm_response_json.get('Next Action')}")
+            vlm_response_json["Next Action"] = "None"
+            vlm_response_json.pop("Box ID", None)
+
     def _update_ledger(self, messages):
         # tobe implemented
         # update the ledger with the current task and plan
         # return the updated ledger
         update_ledger_prompt = ORCHESTRATOR_LEDGER_PROMPT.format(task=self._task)
-        input_message = copy.deepcopy(messages)
-        input_message.append({"role": "user", "content": update_ledger_prompt})
+        input_message = [*messages, {"role": "user", "content": update_ledger_prompt}]
         vlm_response, token_usage = run_oai_interleaved(
                 messages=input_message,
                 system="",
@@ -438,61 +482,13 @@ IMPORTANT NOTES:
         """
         return plan_prompt
 
-def _remove_som_images(messages):
-    for msg in messages:
-        msg_content = msg["content"]
-        if isinstance(msg_content, list):
-            msg["content"] = [
-                cnt for cnt in msg_content 
-                if not (isinstance(cnt, str) and 'som' in cnt and is_image_path(cnt))
-            ]
-
-
-def _maybe_filter_to_n_most_recent_images(
-    messages: list[BetaMessageParam],
-    images_to_keep: int,
-    min_removal_threshold: int = 10,
-):
+
+def _snapshot(messages: list) -> list:
     """
-    With the assumption that images are screenshots that are of diminishing value as
-    the conversation progresses, remove all but the final `images_to_keep` tool_result
-    images in place
+    Copy of the message list and each message's content list, so a background
+    request can read it while the step keeps trimming/appending in place.
     """
-    if images_to_keep is None:
-        return messages
-
-    total_images = 0
-    for msg in messages:
-        for cnt in msg.get("content", []):
-            if isinstance(cnt, str) and is_image_path(cnt):
-                total_images += 1
-            elif isinstance(cnt, dict) and cnt.get("type") == "tool_result":
-                for content in cnt.get("content", []):
-                    if isinstance(content, dict) and content.get("type") == "image":
-                        total_images += 1
-
-    images_to_remove = total_images - images_to_keep
-    
-    for msg in messages:
-        msg_content = msg["content"]
-        if isinstance(msg_content, list):
-            new_content = []
-            for cnt in msg_content:
-                # Remove images from SOM or screenshot as needed
-                if isinstance(cnt, str) and is_image_path(cnt):
-                    if images_to_remove > 0:
-                        images_to_remove -= 1
-                        continue
-                # VLM shouldn't use anthropic screenshot tool so shouldn't have these but in case it does, remove as needed
-                elif isinstance(cnt, dict) and cnt.get("type") == "tool_result":
-                    new_tool_result_content = []
-                    for tool_result_entry in cnt.get("content", []):
-                        if isinstance(tool_result_entry, dict) and tool_result_entry.get("type") == "image":
-                            if images_to_remove > 0:
-                                images_to_remove -= 1
-                                continue
-                        new_tool_result_content.append(tool_result_entry)
-                    cnt["content"] = new_tool_result_content
-                # Append fixed content to current message's content list
-                new_content.append(cnt)
-            msg["content"] = new_content
\ No newline at end of file
+    return [
+        {**msg, "content": list(msg["content"])} if isinstance(msg, dict) and isinstance(msg.get("content"), list) else msg
+        for msg in messages
+    ]
@@ -68,6 +68,10 @@ def setup_state(state):
         state["tools"] = {}
     if "only_n_most_recent_images" not in state:
         state["only_n_most_recent_images"] = 2
+    if "routing" not in state:
+        state["routing"] = False
+    if "task_budget_usd" not in state:
+        state["task_budget_usd"] = 0  # 0 = no budget
     if 'chatbot_messages' not in state:
         state['chatbot_messages'] = []
     if 'stop' not in state:
@@ -242,6 +246,8 @@ def process_input(user_input, state):
         api_key=state["api_key"],
         only_n_most_recent_images=state["only_n_most_recent_images"],
         max_tokens=16384,
+        routing=state["routing"],
+        task_budget_usd=state["task_budget_usd"] or None,
         omniparser_url=args.omniparser_server_url
     ):  
         if loop_msg is None or state.get("stop"):
@@ -315,6 +321,20 @@ with gr.Blocks(theme=gr.themes.Default()) as demo:
                     value=2,
                     interactive=True
                 )
+        with gr.Row():
+            with gr.Column():
+                routing = gr.Checkbox(
+                    label="Route easy steps to a smaller model (omniparser + gpt-4o / o1)",
+                    value=False,
+                    interactive=True
+                )
+            with gr.Column():
+                task_budget = gr.Number(
+                    label="Task budget in USD (0 = no limit)",
+                    value=0,
+                    minimum=0,
+                    interactive=True
+                )
         with gr.Row():
             with gr.Column(1):
                 provider = gr.Dropdown(
@@ -388,6 +408,12 @@ with gr.Blocks(theme=gr.themes.Default()) as demo:
 
     def update_only_n_images(only_n_images_value, state):
         state["only_n_most_recent_images"] = only_n_images_value
+
+    def update_routing(routing_value, state):
+        state["routing"] = routing_value
+
+    def update_task_budget(task_budget_value, state):
+        state["task_budget_usd"] = task_budget_value
    
     def update_provider(provider_value, state):
         # Update state
@@ -415,6 +441,8 @@ with gr.Blocks(theme=gr.themes.Default()) as demo:
 
     model.change(fn=update_model, inputs=[model, state], outputs=[provider, api_key])
     only_n_images.change(fn=update_only_n_images, inputs=[only_n_images, state], outputs=None)
+    routing.change(fn=update_routing, inputs=[routing, state], outputs=None)
+    task_budget.change(fn=update_task_budget, inputs=[task_budget, state], outputs=None)
     provider.change(fn=update_provider, inputs=[provider, state], outputs=api_key)
     api_key.change(fn=update_api_key, inputs=[api_key, state], outputs=None)
     chatbot.clear(fn=clear_chat, inputs=[state], outputs=[chatbot])
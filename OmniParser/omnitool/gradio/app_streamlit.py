@@ -59,6 +59,10 @@ def initialize_session_state():
         st.session_state.anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", "")
     if "only_n_most_recent_images" not in st.session_state:
         st.session_state.only_n_most_recent_images = 2
+    if "routing" not in st.session_state:
+        st.session_state.routing = False
+    if "task_budget_usd" not in st.session_state:
+        st.session_state.task_budget_usd = 0.0  # 0 = no budget
     if "responses" not in st.session_state:
         st.session_state.responses = {}
     if "tools" not in st.session_state:
@@ -270,6 +274,14 @@ def main():
         n_images = st.slider("N most recent screenshots", 0, 10, 2)
         st.session_state.only_n_most_recent_images = n_images
 
+        # Model routing and spend
+        st.session_state.routing = st.checkbox(
+            "Route easy steps to a smaller model (omniparser + gpt-4o / o1)", value=st.session_state.routing
+        )
+        st.session_state.task_budget_usd = st.number_input(
+            "Task budget in USD (0 = no limit)", min_value=0.0, value=st.session_state.task_budget_usd, step=0.05
+        )
+
         # File viewer selection
         file_options = ["None"]
         if st.session_state.uploaded_files:
@@ -420,6 +432,8 @@ def main():
                 api_key=st.session_state.api_key,
                 only_n_most_recent_images=st.session_state.only_n_most_recent_images,
                 max_tokens=16384,
+                routing=st.session_state.routing,
+                task_budget_usd=st.session_state.task_budget_usd or None,
                 omniparser_url=args.omniparser_server_url,
                 save_folder=str(UPLOAD_FOLDER)
             ):
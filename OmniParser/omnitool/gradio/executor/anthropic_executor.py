@@ -1,4 +1,6 @@
 import asyncio
+import threading
+from concurrent.futures import Future
 from typing import Any, Dict, cast
 from collections.abc import Callable
 from anthropic.types.beta import (
@@ -11,8 +13,38 @@ from anthropic.types.beta import (
     BetaToolResultBlockParam,
 )
 from anthropic.types import TextBlock
-from anthropic.types.beta import BetaMessage, BetaTextBlock, BetaToolUseBlock
-from tools import ComputerTool, ToolCollection, ToolResult
+from anthropic.types.beta import BetaTextBlock, BetaToolUseBlock
+from tools import ComputerTool, ToolCollection, ToolResult, get_screenshot
+
+# Computer actions that only read state; they may run concurrently with each
+# other. Every other action changes the screen and runs alone, in order.
+READ_ONLY_ACTIONS = {"screenshot", "cursor_position"}
+
+# Seconds to let the screen react to the last input before the next step's
+# screenshot is prefetched (the VM server no longer sleeps after each input).
+PREFETCH_SETTLE_S = 0.7
+
+
+class SkippedToolCall(Exception):
+    """A tool call that was not run because an earlier call it waits for failed."""
+
+
+_tool_loop: asyncio.AbstractEventLoop | None = None
+_tool_loop_lock = threading.Lock()
+
+
+def _get_tool_loop() -> asyncio.AbstractEventLoop:
+    """
+    The process-wide event loop every executor runs its tool calls on, started
+    on first use. Sharing it keeps one thread and one keep-alive HTTP client
+    (see Transport) for the process instead of one per chat turn.
+    """
+    global _tool_loop
+    with _tool_loop_lock:
+        if _tool_loop is None:
+            _tool_loop = asyncio.new_event_loop()
+            threading.Thread(target=_tool_loop.run_forever, name="tool-loop", daemon=True).start()
+        return _tool_loop
 
 
 class AnthropicExecutor:
@@ -26,6 +58,83 @@ class AnthropicExecutor:
         )
         self.output_callback = output_callback
         self.tool_output_callback = tool_output_callback
+        # long-lived, shared event loop, so HTTP connections and the async
+        # client survive between steps and between executors
+        self.loop = _get_tool_loop()
+        self._prefetch: Future | None = None
+
+    def _submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _schedule_tools(self, blocks: list[BetaToolUseBlock]) -> list[Future]:
+        """
+        Starts every tool_use block on the tool loop and returns one future per
+        block. Read-only actions run concurrently with each other; any other
+        action waits for all earlier blocks and is waited on by all later ones.
+        If a block raises, the blocks waiting on it are not run; their futures
+        raise SkippedToolCall. When the last block finishes (and, after an
+        input, PREFETCH_SETTLE_S has passed), a screenshot is prefetched for
+        the next step.
+        """
+        futures = [Future() for _ in blocks]
+        prefetch = self._prefetch = Future() if blocks else None
+
+        async def run_all():
+            tasks: list[asyncio.Task] = []
+            last_writer: asyncio.Task | None = None
+            for block, future in zip(blocks, futures):
+                tool_input = cast(dict[str, Any], block.input)
+                read_only = block.name == "computer" and tool_input.get("action") in READ_ONLY_ACTIONS
+                deps = ([last_writer] if last_writer else []) if read_only else list(tasks)
+
+                async def run_one(deps=deps, block=block, tool_input=tool_input, future=future):
+                    outcomes = await asyncio.gather(*deps, return_exceptions=True)
+                    if any(isinstance(o, BaseException) for o in outcomes):
+                        e = SkippedToolCall(f"{block.name} call not run: an earlier tool call failed")
+                        future.set_exception(e)
+                        raise e
+                    try:
+                        future.set_result(await self.tool_collection.run(name=block.name, tool_input=tool_input))
+                    except Exception as e:
+                        future.set_exception(e)
+                        raise
+
+                task = asyncio.create_task(run_one())
+                tasks.append(task)
+                if not read_only:
+                    last_writer = task
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if last_writer is not None:
+                await asyncio.sleep(PREFETCH_SETTLE_S)
+            # skipped if close() dropped the prefetch before it started
+            if prefetch is not None and prefetch.set_running_or_notify_cancel():
+                try:
+                    prefetch.set_result(await asyncio.to_thread(get_screenshot))
+                except Exception as e:
+                    prefetch.set_exception(e)
+
+        self._submit(run_all())
+        return futures
+
+    def take_prefetched_screenshot(self):
+        """
+        The (screenshot, path) captured right after the last tool call, or None.
+        Consumed once; the capture overlapped with result handling and UI updates.
+        """
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is None:
+            return None
+        try:
+            return prefetch.result(timeout=30)
+        except Exception as e:
+            print(f"screenshot prefetch failed: {e}")
+            return None
+
+    def close(self):
+        """Drop the prefetch of a screenshot nobody will read. The shared tool loop stays up."""
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None:
+            prefetch.cancel()
 
     def __call__(self, response: BetaMessage, messages: list[BetaMessageParam]):
         new_message = {
@@ -38,15 +147,14 @@ class AnthropicExecutor:
             print("new_message already in messages, there are duplicates.")
         
         tool_result_content: list[BetaToolResultBlockParam] = []
-        for content_block in cast(list[BetaContentBlock], response.content):
+        blocks = cast(list[BetaContentBlock], response.content)
+        # start all tool calls now; results are collected in block order below
+        pending = iter(self._schedule_tools([b for b in blocks if b.type == "tool_use"]))
+        for content_block in blocks:
             self.output_callback(content_block, sender="bot")
             # Execute the tool
             if content_block.type == "tool_use":
-                # Run the asynchronous tool execution in a synchronous context
-                result = asyncio.run(self.tool_collection.run(
-                    name=content_block.name,
-                    tool_input=cast(dict[str, Any], content_block.input),
-                ))
+                result = next(pending).result()
                 
                 self.output_callback(result, sender="bot")
                 
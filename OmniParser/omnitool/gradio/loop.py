@@ -49,10 +49,16 @@ def sampling_loop_sync(
     only_n_most_recent_images: int | None = 2,
     max_tokens: int = 4096,
     omniparser_url: str,
-    save_folder: str = "./uploads"
+    save_folder: str = "./uploads",
+    routing: bool = False,
+    task_budget_usd: float | None = None,
 ):
     """
     Synchronous agentic sampling loop for the assistant/tool interaction of computer use.
+
+    For the non-orchestrated omniparser models, `routing=True` tries the
+    model's small counterpart first (see agent.router.CASCADES) and escalates
+    hard steps; `task_budget_usd` stops the task once its model spend is used up.
     """
     print('in sampling_loop_sync, model:', model)
     omniparser_client = OmniParserClient(url=f"http://{omniparser_url}/parse/")
@@ -74,7 +80,9 @@ def sampling_loop_sync(
             api_response_callback=api_response_callback,
             output_callback=output_callback,
             max_tokens=max_tokens,
-            only_n_most_recent_images=only_n_most_recent_images
+            only_n_most_recent_images=only_n_most_recent_images,
+            routing=routing,
+            task_budget_usd=task_budget_usd,
         )
     elif model in set(["omniparser + gpt-4o-orchestrated", "omniparser + o1-orchestrated", "omniparser + o3-mini-orchestrated", "omniparser + R1-orchestrated", "omniparser + qwen2.5vl-orchestrated"]):
         actor = VLMOrchestratedAgent(
@@ -99,29 +107,34 @@ def sampling_loop_sync(
     
     print(f"Start the message loop. User messages: {messages}")
     
-    if model == "claude-3-5-sonnet-20241022": # Anthropic loop
-        while True:
-            parsed_screen = omniparser_client() # parsed_screen: {"som_image_base64": dino_labled_img, "parsed_content_list": parsed_content_list, "screen_info"}
-            screen_info_block = TextBlock(text='Below is the structured accessibility information of the current UI screen, which includes text and icons you can operate on, take these information into account when you are making the prediction for the next action. Note you will still need to take screenshot to get the image: \n' + parsed_screen['screen_info'], type='text')
-            screen_info_dict = {"role": "user", "content": [screen_info_block]}
-            messages.append(screen_info_dict)
-            tools_use_needed = actor(messages=messages)
+    try:
+        if model == "claude-3-5-sonnet-20241022": # Anthropic loop
+            while True:
+                parsed_screen = omniparser_client(executor.take_prefetched_screenshot()) # parsed_screen: {"som_image_base64": dino_labled_img, "parsed_content_list": parsed_content_list, "screen_info"}
+                screen_info_block = TextBlock(text='Below is the structured accessibility information of the current UI screen, which includes text and icons you can operate on, take these information into account when you are making the prediction for the next action. Note you will still need to take screenshot to get the image: \n' + parsed_screen['screen_info'], type='text')
+                screen_info_dict = {"role": "user", "content": [screen_info_block]}
+                messages.append(screen_info_dict)
+                tools_use_needed = actor(messages=messages)
 
-            for message, tool_result_content in executor(tools_use_needed, messages):
-                yield message
+                for message, tool_result_content in executor(tools_use_needed, messages):
+                    yield message
         
-            if not tool_result_content:
-                return messages
+                if not tool_result_content:
+                    return messages
 
-            messages.append({"content": tool_result_content, "role": "user"})
+                messages.append({"content": tool_result_content, "role": "user"})
     
-    elif model in set(["omniparser + gpt-4o", "omniparser + o1", "omniparser + o3-mini", "omniparser + R1", "omniparser + qwen2.5vl", "omniparser + gpt-4o-orchestrated", "omniparser + o1-orchestrated", "omniparser + o3-mini-orchestrated", "omniparser + R1-orchestrated", "omniparser + qwen2.5vl-orchestrated"]):
-        while True:
-            parsed_screen = omniparser_client()
-            tools_use_needed, vlm_response_json = actor(messages=messages, parsed_screen=parsed_screen)
+        elif model in set(["omniparser + gpt-4o", "omniparser + o1", "omniparser + o3-mini", "omniparser + R1", "omniparser + qwen2.5vl", "omniparser + gpt-4o-orchestrated", "omniparser + o1-orchestrated", "omniparser + o3-mini-orchestrated", "omniparser + R1-orchestrated", "omniparser + qwen2.5vl-orchestrated"]):
+            while True:
+                parsed_screen = omniparser_client(executor.take_prefetched_screenshot())
+                tools_use_needed, vlm_response_json = actor(messages=messages, parsed_screen=parsed_screen)
 
-            for message, tool_result_content in executor(tools_use_needed, messages):
-                yield message
+                for message, tool_result_content in executor(tools_use_needed, messages):
+                    yield message
         
-            if not tool_result_content:
-                return messages
\ No newline at end of file
+                if not tool_result_content:
+                    if isinstance(actor, VLMAgent):
+                        print(f"Model routing summary: {actor.router}")
+                    return messages
+    finally:
+        executor.close()
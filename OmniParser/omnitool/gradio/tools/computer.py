@@ -1,5 +1,5 @@
+import asyncio
 import base64
-import time
 from enum import StrEnum
 from typing import Literal, TypedDict
 
@@ -9,12 +9,14 @@ from anthropic.types.beta import BetaToolComputerUse20241022Param
 
 from .base import BaseAnthropicTool, ToolError, ToolResult
 from .screen_capture import get_screenshot
+from .transport import VM_URL, transport
+import httpx
 import requests
-import re
 
 OUTPUT_DIR = "./tmp/outputs"
 
 TYPING_DELAY_MS = 12
+FOCUS_DELAY_MS = 150  # after a click, before typing into the newly focused control
 TYPING_GROUP_SIZE = 50
 
 Action = Literal[
@@ -56,6 +58,11 @@ class ComputerToolOptions(TypedDict):
     display_number: int | None
 
 
+def input_action(action: str, *args, **kwargs) -> dict:
+    """One primitive of an /input batch."""
+    return {"action": action, "args": list(args), "kwargs": kwargs}
+
+
 def chunks(s: str, chunk_size: int) -> list[str]:
     return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
 
@@ -141,11 +148,11 @@ class ComputerTool(BaseAnthropicTool):
             print(f"mouse move to {x}, {y}")
             
             if action == "mouse_move":
-                self.send_to_vm(f"pyautogui.moveTo({x}, {y})")
+                await self.asend_input("move", x, y)
                 return ToolResult(output=f"Moved mouse to ({x}, {y})")
             elif action == "left_click_drag":
-                current_x, current_y = self.send_to_vm("pyautogui.position()")
-                self.send_to_vm(f"pyautogui.dragTo({x}, {y}, duration=0.5)")
+                current_x, current_y = await self.asend_input("position")
+                await self.asend_input("drag", x, y, duration=0.5)
                 return ToolResult(output=f"Dragged mouse from ({current_x}, {current_y}) to ({x}, {y})")
 
         if action in ("key", "type"):
@@ -158,22 +165,21 @@ class ComputerTool(BaseAnthropicTool):
 
             if action == "key":
                 # Handle key combinations
-                keys = text.split('+')
-                for key in keys:
-                    key = self.key_conversion.get(key.strip(), key.strip())
-                    key = key.lower()
-                    self.send_to_vm(f"pyautogui.keyDown('{key}')")  # Press down each key
-                for key in reversed(keys):
-                    key = self.key_conversion.get(key.strip(), key.strip())
-                    key = key.lower()
-                    self.send_to_vm(f"pyautogui.keyUp('{key}')")    # Release each key in reverse order
+                keys = [self.key_conversion.get(k.strip(), k.strip()).lower() for k in text.split('+')]
+                await self.asend_inputs(
+                    [input_action("keyDown", key) for key in keys]             # Press down each key
+                    + [input_action("keyUp", key) for key in reversed(keys)]   # Release each key in reverse order
+                )
                 return ToolResult(output=f"Pressed keys: {text}")
             
             elif action == "type":
                 # default click before type TODO: check if this is needed
-                self.send_to_vm("pyautogui.click()")
-                self.send_to_vm(f"pyautogui.typewrite('{text}', interval={TYPING_DELAY_MS / 1000})")
-                self.send_to_vm("pyautogui.press('enter')")
+                await self.asend_inputs([
+                    input_action("click"),
+                    input_action("sleep", FOCUS_DELAY_MS / 1000),  # let focus move before typing
+                    input_action("typewrite", text, interval=TYPING_DELAY_MS / 1000),
+                    input_action("press", "enter"),
+                ])
                 screenshot_base64 = (await self.screenshot()).base64_image
                 return ToolResult(output=text, base64_image=screenshot_base64)
 
@@ -194,75 +200,87 @@ class ComputerTool(BaseAnthropicTool):
             if action == "screenshot":
                 return await self.screenshot()
             elif action == "cursor_position":
-                x, y = self.send_to_vm("pyautogui.position()")
+                x, y = await self.asend_input("position")
                 x, y = self.scale_coordinates(ScalingSource.COMPUTER, x, y)
                 return ToolResult(output=f"X={x},Y={y}")
             else:
                 if action == "left_click":
-                    self.send_to_vm("pyautogui.click()")
+                    await self.asend_input("click")
                 elif action == "right_click":
-                    self.send_to_vm("pyautogui.rightClick()")
+                    await self.asend_input("rightClick")
                 elif action == "middle_click":
-                    self.send_to_vm("pyautogui.middleClick()")
+                    await self.asend_input("middleClick")
                 elif action == "double_click":
-                    self.send_to_vm("pyautogui.doubleClick()")
+                    await self.asend_input("doubleClick")
                 elif action == "left_press":
-                    self.send_to_vm("pyautogui.mouseDown()")
-                    time.sleep(1)
-                    self.send_to_vm("pyautogui.mouseUp()")
+                    await self.asend_inputs([
+                        input_action("mouseDown"),
+                        input_action("sleep", 1),
+                        input_action("mouseUp"),
+                    ])
                 return ToolResult(output=f"Performed {action}")
         if action in ("scroll_up", "scroll_down"):
             if action == "scroll_up":
-                self.send_to_vm("pyautogui.scroll(100)")
+                await self.asend_input("scroll", 100)
             elif action == "scroll_down":
-                self.send_to_vm("pyautogui.scroll(-100)")
+                await self.asend_input("scroll", -100)
             return ToolResult(output=f"Performed {action}")
         if action == "hover":
             return ToolResult(output=f"Performed {action}")
         if action == "wait":
-            time.sleep(1)
+            await asyncio.sleep(1)
             return ToolResult(output=f"Performed {action}")
         raise ToolError(f"Invalid action: {action}")
 
-    def send_to_vm(self, action: str):
+    def send_input(self, action: str, *args, **kwargs):
         """
-        Executes a python command on the server. Only return tuple of x,y when action is "pyautogui.position()"
+        Runs one structured input action (see INPUT_ACTIONS in the VM server) in
+        the server's resident pyautogui. Returns the action's result, e.g. [x, y]
+        for "position".
         """
-        prefix = "import pyautogui; pyautogui.FAILSAFE = False;"
-        command_list = ["python", "-c", f"{prefix} {action}"]
-        parse = action == "pyautogui.position()"
-        if parse:
-            command_list[-1] = f"{prefix} print({action})"
+        return self.send_inputs([input_action(action, *args, **kwargs)])[0]
 
+    def send_inputs(self, actions: list[dict]) -> list:
+        """
+        Runs an ordered batch of input actions in one request; the server
+        executes them back to back under its control lock. Returns their results.
+        """
         try:
-            print(f"sending to vm: {command_list}")
-            response = requests.post(
-                f"http://localhost:5000/execute", 
-                headers={'Content-Type': 'application/json'},
-                json={"command": command_list},
-                timeout=90
-            )
-            time.sleep(0.7) # avoid async error as actions take time to complete
-            print(f"action executed")
+            print(f"sending to vm: {actions}")
+            response = transport.post(f"{VM_URL}/input", json={"actions": actions})
             if response.status_code != 200:
-                raise ToolError(f"Failed to execute command. Status code: {response.status_code}")
-            if parse:
-                output = response.json()['output'].strip()
-                match = re.search(r'Point\(x=(\d+),\s*y=(\d+)\)', output)
-                if not match:
-                    raise ToolError(f"Could not parse coordinates from output: {output}")
-                x, y = map(int, match.groups())
-                return x, y
+                raise ToolError(f"Failed to execute input action. Status code: {response.status_code}, {response.text}")
+            body = response.json()
+            print(f"action executed in {body.get('timings_ms')} ms")
+            return body['results']
         except requests.exceptions.RequestException as e:
             raise ToolError(f"An error occurred while trying to execute the command: {str(e)}")
 
+    async def asend_input(self, action: str, *args, **kwargs):
+        """Non-blocking `send_input`, for use inside __call__."""
+        return (await self.asend_inputs([input_action(action, *args, **kwargs)]))[0]
+
+    async def asend_inputs(self, actions: list[dict]) -> list:
+        """Non-blocking `send_inputs`: awaits the request instead of blocking the event loop."""
+        try:
+            print(f"sending to vm: {actions}")
+            response = await transport.apost(f"{VM_URL}/input", json={"actions": actions})
+            if response.status_code != 200:
+                raise ToolError(f"Failed to execute input action. Status code: {response.status_code}, {response.text}")
+            body = response.json()
+            print(f"action executed in {body.get('timings_ms')} ms")
+            return body['results']
+        except httpx.HTTPError as e:
+            raise ToolError(f"An error occurred while trying to execute the command: {str(e)}")
+
     async def screenshot(self):
         if not hasattr(self, 'target_dimension'):
-            screenshot = self.padding_image(screenshot)
             self.target_dimension = MAX_SCALING_TARGETS["WXGA"]
         width, height = self.target_dimension["width"], self.target_dimension["height"]
-        screenshot, path = get_screenshot(resize=True, target_width=width, target_height=height)
-        time.sleep(0.7) # avoid async error as actions take time to complete
+        # capture and file write run in a worker thread so the event loop stays free
+        screenshot, path = await asyncio.to_thread(
+            get_screenshot, resize=True, target_width=width, target_height=height
+        )
         return ToolResult(base64_image=base64.b64encode(path.read_bytes()).decode())
 
     def padding_image(self, screenshot):
@@ -310,20 +328,10 @@ class ComputerTool(BaseAnthropicTool):
     def get_screen_size(self):
         """Return width and height of the screen"""
         try:
-            response = requests.post(
-                f"http://localhost:5000/execute",
-                headers={'Content-Type': 'application/json'},
-                json={"command": ["python", "-c", "import pyautogui; print(pyautogui.size())"]},
-                timeout=90
-            )
+            response = transport.post(f"{VM_URL}/input", json={"action": "size"})
             if response.status_code != 200:
                 raise ToolError(f"Failed to get screen size. Status code: {response.status_code}")
-            
-            output = response.json()['output'].strip()
-            match = re.search(r'Size\(width=(\d+),\s*height=(\d+)\)', output)
-            if not match:
-                raise ToolError(f"Could not parse screen size from output: {output}")
-            width, height = map(int, match.groups())
+            width, height = response.json()['result']
             return width, height
         except requests.exceptions.RequestException as e:
-            raise ToolError(f"An error occurred while trying to get screen size: {str(e)}")
\ No newline at end of file
+            raise ToolError(f"An error occurred while trying to get screen size: {str(e)}")
@@ -1,29 +1,97 @@
 from pathlib import Path
 from uuid import uuid4
-import requests
 from PIL import Image
 from .base import BaseAnthropicTool, ToolError
+from .screen_stream import default_buffer
+from .transport import VM_URL, transport
 from io import BytesIO
 
 OUTPUT_DIR = "./tmp/outputs"
 
-def get_screenshot(resize: bool = False, target_width: int = 1920, target_height: int = 1080):
-    """Capture screenshot by requesting from HTTP endpoint - returns native resolution unless resized"""
+# "raw" is headerless pixel bytes; size and mode come from the X-Width/X-Height/X-Mode headers
+SUFFIXES = {"png": ".png", "jpeg": ".jpg", "webp": ".webp", "raw": ".rgb"}
+
+# Last frame per request (format/size/region): ETag, image and saved path.
+# When the server answers 304 the screen has not changed and they are reused.
+_last_frame: dict[tuple, tuple[str, Image.Image, Path]] = {}
+
+def get_screenshot(
+    resize: bool = False,
+    target_width: int = 1920,
+    target_height: int = 1080,
+    *,
+    fmt: str = "png",
+    quality: int = 80,
+    region: tuple[int, int, int, int] | None = None,
+):
+    """
+    Capture screenshot by requesting from HTTP endpoint - returns native resolution unless resized.
+    `fmt` is png, jpeg, webp or raw (RGB bytes, saved as-is to a .rgb file).
+
+    Resizing, cropping (`region` = x, y, w, h) and encoding happen on the VM; the
+    bytes are written to disk as received. If the frame is unchanged since the
+    last identical request, the previous image and path are returned.
+
+    With OMNI_SCREEN_STREAM=1 the frame comes from the local FrameBuffer fed by
+    the VM's /stream endpoint; HTTP is only used if no fresh frame arrives in time.
+    """
+    if fmt not in SUFFIXES:
+        raise ToolError(f"Unsupported screenshot format {fmt!r}; expected one of {', '.join(SUFFIXES)}")
     output_dir = Path(OUTPUT_DIR)
     output_dir.mkdir(parents=True, exist_ok=True)
-    path = output_dir / f"screenshot_{uuid4().hex}.png"
-    
+
+    # streamed frame buffer (OMNI_SCREEN_STREAM=1): read the screen from memory
+    if (buffer := default_buffer()) is not None:
+        screenshot = buffer.snapshot()
+        if screenshot is not None:
+            if region:
+                x, y, w, h = region
+                screenshot = screenshot.crop((x, y, x + w, y + h))
+            if resize and screenshot.size != (target_width, target_height):
+                screenshot = screenshot.resize((target_width, target_height))
+            path = output_dir / f"screenshot_{uuid4().hex}{SUFFIXES[fmt]}"
+            if fmt == "raw":
+                path.write_bytes(screenshot.tobytes())
+            elif fmt == "png":
+                screenshot.save(path, compress_level=1)
+            else:
+                screenshot.save(path, quality=quality)
+            return screenshot, path
+
+    params = {"format": fmt, "quality": quality}
+    if resize:
+        params |= {"width": target_width, "height": target_height}
+    if region:
+        params["region"] = ",".join(str(v) for v in region)
+    key = tuple(sorted(params.items()))
+    last = _last_frame.get(key)
+
     try:
-        response = requests.get('http://localhost:5000/screenshot')
+        response = transport.get(
+            f"{VM_URL}/screenshot",
+            params=params,
+            headers={"If-None-Match": last[0]} if last else {},
+        )
+        if response.status_code == 304:
+            if last[2].exists():
+                return last[1], last[2]
+            # cached file was cleaned up; fetch the frame again
+            response = transport.get(f"{VM_URL}/screenshot", params=params)
         if response.status_code != 200:
             raise ToolError(f"Failed to capture screenshot: HTTP {response.status_code}")
-        
-        # (1280, 800)
-        screenshot = Image.open(BytesIO(response.content))
-        
-        if resize and screenshot.size != (target_width, target_height):
-            screenshot = screenshot.resize((target_width, target_height))
-        screenshot.save(path)
+
+        path = output_dir / f"screenshot_{uuid4().hex}{SUFFIXES[fmt]}"
+        path.write_bytes(response.content)
+        if fmt == "raw":
+            size = (int(response.headers["X-Width"]), int(response.headers["X-Height"]))
+            screenshot = Image.frombytes(response.headers.get("X-Mode", "RGB"), size, response.content)
+        else:
+            # (1280, 800); Image.open only parses the header, pixels decode on first use
+            screenshot = Image.open(BytesIO(response.content))
+        if etag := response.headers.get("ETag"):
+            _last_frame[key] = (etag, screenshot, path)
         return screenshot, path
+    except ToolError:
+        raise
     except Exception as e:
-        raise ToolError(f"Failed to capture screenshot: {str(e)}")
\ No newline at end of file
+        raise ToolError(f"Failed to capture screenshot: {str(e)}")
@@ -0,0 +1,102 @@
+import json
+import os
+import struct
+import threading
+import zlib
+
+from PIL import Image
+
+from .transport import VM_URL, transport
+
+STREAM_URL = f"{VM_URL}/stream"
+
+
+class FrameBuffer:
+    """
+    Local copy of the VM screen, kept current by the server's /stream feed.
+
+    A background thread reads the keyframe and the dirty-rectangle updates
+    that follow and pastes them into an in-memory image, so reading the
+    screen is a memory copy rather than an HTTP round trip. If the stream
+    drops, the thread reconnects (and gets a fresh keyframe).
+    """
+
+    def __init__(self, url: str = STREAM_URL, fps: float = 10):
+        self.url = url
+        self.fps = fps
+        self._frame: Image.Image | None = None
+        self._seq = 0                      # frames applied since start, across reconnects
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="screen-stream", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with transport.session.get(self.url, params={"fps": self.fps}, stream=True, timeout=(5, 30)) as response:
+                    response.raise_for_status()
+                    self._consume(response.raw)
+            except Exception as e:
+                print(f"screen stream interrupted: {e}")
+                self._stop.wait(1.0)
+
+    def _consume(self, raw):
+        def read(n: int) -> bytes:
+            data = b""
+            while len(data) < n:
+                chunk = raw.read(n - len(data))
+                if not chunk:
+                    raise ConnectionError("stream closed")
+                data += chunk
+            return data
+
+        while not self._stop.is_set():
+            (head_len,) = struct.unpack(">I", read(4))
+            header = json.loads(read(head_len))
+            size = (header["width"], header["height"])
+            patches = [
+                (Image.frombytes("RGB", (w, h), zlib.decompress(read(nbytes))), (x, y))
+                for x, y, w, h, nbytes in header["rects"]
+            ]
+            with self._cond:                # apply the whole message at once
+                if header["type"] == "key" or self._frame is None or self._frame.size != size:
+                    self._frame = Image.new("RGB", size)
+                for patch, xy in patches:
+                    self._frame.paste(patch, xy)
+                self._seq += 1
+                self._cond.notify_all()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def snapshot(self, fresh: bool = True, timeout: float = 1.0) -> Image.Image | None:
+        """
+        Copy of the current screen. With `fresh`, waits for two more frames so
+        the copy was captured after this call (i.e. after any preceding input
+        action). Returns None if no suitable frame arrives within `timeout`.
+        """
+        with self._cond:
+            target = self._seq + (2 if fresh else 0)
+            if not self._cond.wait_for(lambda: self._frame is not None and self._seq >= target, timeout):
+                return None
+            return self._frame.copy()
+
+    def close(self):
+        self._stop.set()
+
+
+_buffer: FrameBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def default_buffer() -> FrameBuffer | None:
+    """The shared FrameBuffer when OMNI_SCREEN_STREAM=1, else None (HTTP screenshots)."""
+    global _buffer
+    if os.getenv("OMNI_SCREEN_STREAM", "") != "1":
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = FrameBuffer(fps=float(os.getenv("OMNI_SCREEN_STREAM_FPS", "10")))
+        return _buffer
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+VM_URL = "http://localhost:5000"
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    timeout: tuple[float, float] = (3.0, 90.0)  # (connect, read) seconds
+    retries: int = 0
+    idempotent: bool = True  # non-idempotent calls are only retried if the connection was never made
+    backoff: float = 0.2
+
+
+# Per-path policies; anything unlisted uses EndpointPolicy().
+POLICIES: dict[str, EndpointPolicy] = {
+    "/probe": EndpointPolicy(timeout=(1.0, 3.0), retries=0),
+    "/input": EndpointPolicy(timeout=(3.0, 90.0), retries=2, idempotent=False),
+    "/screenshot": EndpointPolicy(timeout=(3.0, 30.0), retries=2),
+    "/parse/": EndpointPolicy(timeout=(3.0, 120.0), retries=1),
+}
+
+
+class LatencyStats:
+    """Count, mean, max and p50/p90 over the last `window` calls of one endpoint."""
+
+    def __init__(self, window: int = 256):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds: float, ok: bool = True):
+        self.count += 1
+        self.errors += not ok
+        self.total_s += seconds
+        self.max_s = max(self.max_s, seconds)
+        self.recent.append(seconds)
+
+    def as_dict(self) -> dict:
+        recent = sorted(self.recent)
+        pick = lambda q: round(recent[int(q * (len(recent) - 1))] * 1000, 1) if recent else 0.0
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_s / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": pick(0.5),
+            "p90_ms": pick(0.9),
+            "max_ms": round(self.max_s * 1000, 1),
+        }
+
+
+class Transport:
+    """
+    Keep-alive HTTP client shared by ComputerTool, screen capture and the
+    OmniParser client: one pooled requests.Session, per-endpoint timeouts and
+    retries (see POLICIES), and latency counters per endpoint.  Async callers
+    use `arequest`, which applies the same policies through a keep-alive
+    httpx.AsyncClient (one per event loop) without blocking the loop.
+    """
+
+    def __init__(self, pool_size: int = 8):
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._stats: dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        path = urlparse(url).path or "/"
+        policy = POLICIES.get(path, EndpointPolicy())
+        kwargs.setdefault("timeout", policy.timeout)
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                self._record(path, time.perf_counter() - t0, response.status_code < 500)
+                if response.status_code in (502, 503, 504) and policy.idempotent and attempt < policy.retries:
+                    attempt += 1
+                    time.sleep(policy.backoff * attempt)
+                    continue
+                return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(path, time.perf_counter() - t0, False)
+                never_sent = isinstance(e, requests.ConnectTimeout) or (not isinstance(e, requests.Timeout) and _refused(e))
+                if attempt >= policy.retries or not (policy.idempotent or never_sent):
+                    raise
+                attempt += 1
+                time.sleep(policy.backoff * attempt)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            client = self._aclients[loop] = httpx.AsyncClient(limits=limits)
+        return client
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Non-blocking `request`; raises httpx.HTTPError subclasses instead of requests'."""
+        path = urlparse(url).path or "/"
+        policy = POLICIES.get(path, EndpointPolicy())
+        connect, read = kwargs.pop("timeout", policy.timeout)
+        kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+        client = self._async_client()
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                self._record(path, time.perf_counter() - t0, response.status_code < 500)
+                if response.status_code in (502, 503, 504) and policy.idempotent and attempt < policy.retries:
+                    attempt += 1
+                    await asyncio.sleep(policy.backoff * attempt)
+                    continue
+                return response
+            except httpx.TransportError as e:
+                self._record(path, time.perf_counter() - t0, False)
+                never_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if attempt >= policy.retries or not (policy.idempotent or never_sent):
+                    raise
+                attempt += 1
+                await asyncio.sleep(policy.backoff * attempt)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", url, **kwargs)
+
+    def _record(self, path: str, seconds: float, ok: bool):
+        with self._lock:
+            self._stats.setdefault(path, LatencyStats()).add(seconds, ok)
+
+    def stats(self) -> dict[str, dict]:
+        """Latency counters per endpoint path."""
+        with self._lock:
+            return {path: s.as_dict() for path, s in self._stats.items()}
+
+
+def _refused(e: requests.ConnectionError) -> bool:
+    """True if the connection could not be established, so the request never reached the server."""
+    text = str(e)
+    return "NewConnectionError" in text or "Connection refused" in text
+
+
+# Process-wide transport used by the tools and the OmniParser client.
+transport = Transport()
@@ -3,11 +3,15 @@ import logging
 import argparse
 import shlex
 import subprocess
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify
 import threading
 import traceback
+import time
+import zlib
+import json
+import struct
 import pyautogui
-from PIL import Image
+from PIL import Image, ImageChops
 from io import BytesIO
 
 parser = argparse.ArgumentParser()
@@ -23,6 +27,65 @@ app = Flask(__name__)
 
 computer_control_lock = threading.Lock()
 
+# pyautogui stays imported in this process, so input actions run in-process
+# instead of spawning `python -c "import pyautogui; ..."` for each one.
+pyautogui.FAILSAFE = False
+pyautogui.PAUSE = 0  # no implicit sleep after every call; callers pace themselves
+
+# Structured actions accepted by /input, mapped to the pyautogui call they make.
+INPUT_ACTIONS = {
+    "move": pyautogui.moveTo,
+    "drag": pyautogui.dragTo,
+    "click": pyautogui.click,
+    "rightClick": pyautogui.rightClick,
+    "middleClick": pyautogui.middleClick,
+    "doubleClick": pyautogui.doubleClick,
+    "mouseDown": pyautogui.mouseDown,
+    "mouseUp": pyautogui.mouseUp,
+    "keyDown": pyautogui.keyDown,
+    "keyUp": pyautogui.keyUp,
+    "press": pyautogui.press,
+    "hotkey": pyautogui.hotkey,
+    "typewrite": pyautogui.typewrite,
+    "scroll": pyautogui.scroll,
+    "position": pyautogui.position,
+    "size": pyautogui.size,
+    "sleep": time.sleep,  # explicit pause between primitives of a batch
+}
+
+
+def release_held(held_keys, held_buttons):
+    """Releases keys and mouse buttons a failed batch pressed but did not release."""
+    for key in reversed(held_keys):
+        try:
+            pyautogui.keyUp(key)
+        except Exception:
+            logger.error("\n" + traceback.format_exc() + "\n")
+    for button in reversed(held_buttons):
+        try:
+            pyautogui.mouseUp(button=button)
+        except Exception:
+            logger.error("\n" + traceback.format_exc() + "\n")
+
+
+def _held(action):
+    """The key of a keyDown/keyUp, or the button of a mouseDown/mouseUp payload."""
+    args, kwargs = action.get("args", []), action.get("kwargs", {})
+    if action.get("action") in ("keyDown", "keyUp"):
+        return args[0] if args else kwargs.get("key")
+    return kwargs.get("button", args[2] if len(args) > 2 else "left")
+
+
+def run_input_action(action):
+    """Runs one {"action": name, "args": [...], "kwargs": {...}} payload; returns a JSON-able result."""
+    name = action.get("action")
+    if name not in INPUT_ACTIONS:
+        raise ValueError(f"unknown input action: {name}")
+    result = INPUT_ACTIONS[name](*action.get("args", []), **action.get("kwargs", {}))
+    if name in ("position", "size"):
+        return list(result)
+    return None
+
 @app.route('/probe', methods=['GET'])
 def probe_endpoint():
     return jsonify({"status": "Probe successful", "message": "Service is operational"}), 200
@@ -60,22 +123,189 @@ def execute_command():
                 'message': str(e)
             }), 500
 
-@app.route('/screenshot', methods=['GET'])
-def capture_screen_with_cursor():    
-    cursor_path = os.path.join(os.path.dirname(__file__), "cursor.png")
+@app.route('/input', methods=['POST'])
+def input_action():
+    """
+    Accepts one action object, or {"actions": [...]} to run an ordered batch
+    (e.g. keyDown ctrl, keyDown t, keyUp t, keyUp ctrl) atomically under
+    computer_control_lock.  A batch stops at the first failing primitive,
+    releases any key or mouse button it left pressed, and returns the results
+    and per-primitive timings (ms) of those that ran.
+    """
+    data = request.json
+    batch = 'actions' in data
+    actions = data['actions'] if batch else [data]
+    results, timings_ms = [], []
+    held_keys, held_buttons = [], []
+    with computer_control_lock:
+        try:
+            for action in actions:
+                t0 = time.perf_counter()
+                results.append(run_input_action(action))
+                timings_ms.append(round((time.perf_counter() - t0) * 1000, 2))
+                name = action.get("action")
+                if name == "keyDown":
+                    held_keys.append(_held(action))
+                elif name == "mouseDown":
+                    held_buttons.append(_held(action))
+                elif name in ("keyUp", "mouseUp"):
+                    held = held_keys if name == "keyUp" else held_buttons
+                    if _held(action) in held:
+                        held.remove(_held(action))
+        except Exception as e:
+            logger.error("\n" + traceback.format_exc() + "\n")
+            release_held(held_keys, held_buttons)
+            return jsonify({
+                'status': 'error',
+                'message': str(e),
+                'failed_index': len(results),
+                'results': results,
+                'timings_ms': timings_ms
+            }), 400 if isinstance(e, (ValueError, TypeError)) else 500
+    if batch:
+        return jsonify({'status': 'success', 'results': results, 'timings_ms': timings_ms})
+    return jsonify({'status': 'success', 'result': results[0], 'timings_ms': timings_ms})
+
+CURSOR_PATH = os.path.join(os.path.dirname(__file__), "cursor.png")
+_cursor = None
+
+# format → (PIL format, mimetype, save options)
+SCREENSHOT_FORMATS = {
+    "png": ("PNG", "image/png", {"compress_level": 1}),
+    "jpeg": ("JPEG", "image/jpeg", {}),
+    "webp": ("WEBP", "image/webp", {}),
+}
+
+
+def get_cursor():
+    """The cursor sprite, loaded and shrunk once."""
+    global _cursor
+    if _cursor is None:
+        cursor = Image.open(CURSOR_PATH)
+        # make the cursor smaller
+        _cursor = cursor.resize((int(cursor.width / 1.5), int(cursor.height / 1.5)))
+    return _cursor
+
+
+def grab_frame(region=None, size=None):
+    """Screen with the cursor drawn in, optionally cropped to region (x, y, w, h) and resized to size (w, h)."""
     screenshot = pyautogui.screenshot()
     cursor_x, cursor_y = pyautogui.position()
-    cursor = Image.open(cursor_path)
-    # make the cursor smaller
-    cursor = cursor.resize((int(cursor.width / 1.5), int(cursor.height / 1.5)))
+    cursor = get_cursor()
     screenshot.paste(cursor, (cursor_x, cursor_y), cursor)
-    
+    if region:
+        x, y, w, h = region
+        screenshot = screenshot.crop((x, y, x + w, y + h))
+    if size and screenshot.size != size:
+        screenshot = screenshot.resize(size)
+    return screenshot
+
+
+@app.route('/screenshot', methods=['GET'])
+def capture_screen_with_cursor():
+    """
+    Query parameters:
+      format   png (default) | jpeg | webp | raw (RGB bytes, size in X-Width/X-Height)
+      quality  jpeg/webp quality, default 80
+      region   x,y,w,h crop in screen pixels
+      width, height  resize the (cropped) frame to this size
+    The ETag is a hash of the frame's pixels; a matching If-None-Match gets a
+    304 without encoding anything.
+    """
+    fmt = request.args.get('format', 'png').lower()
+    if fmt != 'raw' and fmt not in SCREENSHOT_FORMATS:
+        return jsonify({'status': 'error', 'message': f'unknown format: {fmt}'}), 400
+    try:
+        region = request.args.get('region')
+        region = tuple(int(v) for v in region.split(',')) if region else None
+        if region and (len(region) != 4 or region[2] <= 0 or region[3] <= 0):
+            raise ValueError('region must be x,y,w,h with positive w and h')
+        width, height = request.args.get('width', type=int), request.args.get('height', type=int)
+        if (width is not None and width <= 0) or (height is not None and height <= 0):
+            raise ValueError('width and height must be positive')
+        size = (width, height) if width and height else None
+        quality = request.args.get('quality', 80, type=int)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    screenshot = grab_frame(region, size)
+    pixels = screenshot.tobytes()
+    etag = f'"{zlib.crc32(pixels):08x}-{screenshot.width}x{screenshot.height}-{fmt}-{quality}"'
+    headers = {'ETag': etag, 'X-Width': str(screenshot.width), 'X-Height': str(screenshot.height)}
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, headers
+
+    if fmt == 'raw':
+        return Response(pixels, mimetype='application/octet-stream',
+                        headers=headers | {'X-Mode': screenshot.mode})
 
     # Convert PIL Image to bytes and send
+    pil_format, mimetype, options = SCREENSHOT_FORMATS[fmt]
+    if pil_format == 'JPEG':
+        screenshot = screenshot.convert('RGB')
+    if pil_format != 'PNG':
+        options = options | {'quality': quality}
     img_io = BytesIO()
-    screenshot.save(img_io, 'PNG')
-    img_io.seek(0)
-    return send_file(img_io, mimetype='image/png')
+    screenshot.save(img_io, pil_format, **options)
+    return Response(img_io.getvalue(), mimetype=mimetype, headers=headers)
+
+STREAM_BANDS = 8  # dirty rectangles are searched per horizontal band
+
+
+def dirty_rects(prev, cur):
+    """Bounding boxes (x, y, w, h) of the changed pixels, at most one per horizontal band."""
+    diff = ImageChops.difference(prev, cur)
+    band_h = -(-cur.height // STREAM_BANDS)
+    rects = []
+    for top in range(0, cur.height, band_h):
+        box = diff.crop((0, top, cur.width, min(top + band_h, cur.height))).getbbox()
+        if box:
+            x0, y0, x1, y1 = box
+            rects.append((x0, top + y0, x1 - x0, y1 - y0))
+    return rects
+
+
+def stream_message(header, payload=b''):
+    """One stream message: 4-byte big-endian header length, JSON header, payload."""
+    head = json.dumps(header).encode()
+    return struct.pack('>I', len(head)) + head + payload
+
+
+@app.route('/stream', methods=['GET'])
+def stream_screen():
+    """
+    Continuous screen feed over chunked HTTP.  The first message is a keyframe
+    with the whole screen; every later tick sends only the rectangles that
+    changed (possibly none, as a heartbeat).  Each rect's pixels are raw RGB,
+    zlib-compressed; `rects` lists [x, y, w, h, nbytes] in payload order.
+
+    Query parameters: fps (default 10), keyframe_every (ticks between full
+    keyframes, default 300).
+    """
+    fps = min(max(request.args.get('fps', 10, type=float), 0.5), 30)
+    keyframe_every = max(request.args.get('keyframe_every', 300, type=int), 1)
+
+    def generate():
+        prev, seq = None, 0
+        while True:
+            t0 = time.perf_counter()
+            frame = grab_frame().convert('RGB')
+            if prev is None or prev.size != frame.size or seq % keyframe_every == 0:
+                rects, kind = [(0, 0, frame.width, frame.height)], 'key'
+            else:
+                rects, kind = dirty_rects(prev, frame), 'delta'
+            chunks = [zlib.compress(frame.crop((x, y, x + w, y + h)).tobytes(), 1) for x, y, w, h in rects]
+            yield stream_message({
+                'type': kind,
+                'seq': seq,
+                'width': frame.width,
+                'height': frame.height,
+                'rects': [[*r, len(c)] for r, c in zip(rects, chunks)],
+            }, b''.join(chunks))
+            prev, seq = frame, seq + 1
+            time.sleep(max(0.0, 1 / fps - (time.perf_counter() - t0)))
+
+    return Response(generate(), mimetype='application/octet-stream')
 
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=args.port)
\ No newline at end of file
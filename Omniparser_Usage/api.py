@@ -2,6 +2,8 @@ import io
 import os
 import base64
 import logging
+import threading
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, List
 
@@ -29,6 +31,24 @@ def _image_to_base64(img: Image.Image) -> str:
     return base64.b64encode(buf.getvalue()).decode("ascii")
 
 
+# One parser per process: models are loaded once and inference is serialised,
+# so concurrent runs share the same weights (and GPU) safely.
+_parser_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _load_models():
+    logger.info("Loading YOLO icon detector…")
+    yolo = get_yolo_model(model_path=str(Path(__file__).parent / "../OmniParser/weights/icon_detect/model.pt"))
+
+    logger.info("Loading Florence caption model…")
+    captioner = get_caption_model_processor(
+        model_name="florence2",
+        model_name_or_path=str(Path(__file__).parent / "../OmniParser/weights/icon_caption_florence"),
+    )
+    return yolo, captioner
+
+
 def process_image(
     image_path: str,
     box_threshold: float = 0.05,
@@ -41,6 +61,17 @@ def process_image(
       - annotated_image: base64-encoded PNG
       - elements: List of {label, coords, caption, ...}
     """
+    with _parser_lock:
+        return _process_image(image_path, box_threshold, iou_threshold, use_paddleocr, imgsz)
+
+
+def _process_image(
+    image_path: str,
+    box_threshold: float,
+    iou_threshold: float,
+    use_paddleocr: bool,
+    imgsz: int,
+) -> Dict[str, Any]:
     # 1) device
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     logger.info(f"OmniParser running on device: {device}")
@@ -49,15 +80,8 @@ def process_image(
     # 2) load image
     img = Image.open(image_path)
 
-    # 3) load models
-    logger.info("Loading YOLO icon detector…")
-    yolo = get_yolo_model(model_path=str(Path(__file__).parent / "../OmniParser/weights/icon_detect/model.pt"))
-
-    logger.info("Loading Florence caption model…")
-    captioner = get_caption_model_processor(
-        model_name="florence2",
-        model_name_or_path=str(Path(__file__).parent / "../OmniParser/weights/icon_caption_florence"),
-    )
+    # 3) load models (cached after the first call)
+    yolo, captioner = _load_models()
 
     # 4) OCR
     logger.info("Running OCR…")
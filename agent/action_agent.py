@@ -12,6 +12,29 @@ from pathlib import Path
 class ActionAgent(BaseLLMAgent):
     """Produces a low‑level driver JSON command from a step description."""
 
+    # actions that do not target an element
+    _NO_ELEMENT = {"key", "scroll", "wait"}
+
+    @staticmethod
+    def _attach_bboxes(raw: Dict[str, Any], entities: List[Dict[str, Any]]) -> None:
+        """
+        Copy the bbox of the chosen element onto the action (or each macro
+        step). Actions that do not target an element (key, scroll, wait) are
+        left as they are, at the top level as well as inside a sequence.
+        """
+        targets = raw.get("steps") if raw.get("action") == "sequence" else [raw]
+        if not targets:
+            raise ValueError("Sequence action has no steps.")
+        for target in targets:
+            if target.get("action") in ActionAgent._NO_ELEMENT:
+                continue
+            for element in entities:
+                if element["id"] == target.get("id") and element["content"] == target.get("content"):
+                    target["bbox"] = element["bbox"]
+                    break
+            else:
+                raise ValueError(f"Attribute is not compatible: {target}")
+
     def decide(self, step: Dict[str, Any], entities: List[Dict[str, Any]], screenshots: List[Path | str] | None = None) -> str:
         #indexed = [{"id": i, **e} for i, e in enumerate(entities)]
         ent_snip = json.dumps(entities)
@@ -38,6 +61,14 @@ class ActionAgent(BaseLLMAgent):
             "reason": string,                       // why this action is necessary to achieve the goal.
             }}
 
+            If the step needs several inputs in a row on this same screen (e.g. type into a field and press Enter),
+            you may instead return one macro; every element step still selects an element by id and content:
+            {{
+            "action": "sequence",
+            "steps": [{{"id": int, "content": string, "action": "type", "text": string}}, {{"action": "key", "key": "ENTER"}}],
+            "reason": string,
+            }}
+
             Return only the JSON object, no markdown fences.
             """.strip()
 
@@ -58,14 +89,7 @@ class ActionAgent(BaseLLMAgent):
         #"bbox": [float, float, float, float],   // exactly to the bbox of the element that match with the id [x1, y1, x2, y2].
         print("Step from action_agent file", {step["step"]})
         
-        bbox = []
-        for element in entities:
-            if element["id"] == raw.get("id") and element["content"] == raw.get("content"):
-                bbox = element["bbox"]
-                raw["bbox"] = bbox
-                break
-        else:
-                raise ValueError("Attribute is not compatible.")
+        self._attach_bboxes(raw, entities)
         print(f"ActionAgent raw output: {raw}")
         try:
             #print(type(json.loads(raw)))
@@ -98,6 +122,14 @@ class ActionAgent(BaseLLMAgent):
             "reason": string,                       // why this action is necessary to achieve the goal.
             }}
 
+            If the step needs several inputs in a row on this same screen (e.g. type into a field and press Enter),
+            you may instead return one macro; every element step still selects an element by id and content:
+            {{
+            "action": "sequence",
+            "steps": [{{"id": int, "content": string, "action": "type", "text": string}}, {{"action": "key", "key": "ENTER"}}],
+            "reason": string,
+            }}
+
             Return only the JSON object, no markdown fences.
         """.strip()
 
@@ -117,14 +149,7 @@ class ActionAgent(BaseLLMAgent):
             )
         print("Step from action_agent file", {step["step"]})
         print(f"ActionAgent raw output: {raw}")
-        bbox = []
-        for element in entities:
-            if element["id"] == raw.get("id") and element["content"] == raw.get("content"):
-                bbox = element["bbox"]
-                raw["bbox"] = bbox
-                break
-        else:
-                raise ValueError("Attribute is not match.")
+        self._attach_bboxes(raw, entities)
         try:
             #print(type(json.loads(raw)))
             return raw
@@ -1,7 +1,6 @@
 
 # base_llm_agent.py
 from __future__ import annotations
-import base64
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Mapping, Union
@@ -13,6 +12,9 @@ from langchain_community.chat_models import ChatOllama
 from qwen_vl_utils import process_vision_info 
 from langchain_openai import ChatOpenAI  
 
+from .llm_cache import LLMResponseCache
+from .image_prep import ImagePrepConfig, default_preprocessor, profile_for_model
+
 
 _FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", flags=re.IGNORECASE)
 
@@ -28,6 +30,10 @@ class BaseLLMAgent:
     response_format: Dict[str, str] = field(
         default_factory=lambda: {"type": "json_object"}
     )
+    # opt-in response cache; see agent/llm_cache.py
+    cache: LLMResponseCache | None = None
+    # resize/re-encode settings for screenshots; None → profile matching the model
+    image_prep: ImagePrepConfig | None = None
 
     _model: BaseChatModel = field(init=False, repr=False)
     _backend: str = field(init=False, repr=False) #need when using openai
@@ -36,6 +42,9 @@ class BaseLLMAgent:
             self._model = self.llm
             self._backend = "custom"
         model_name = self.llm or "gpt-4o-mini"
+        self._model_name = str(model_name)
+        if self.image_prep is None:
+            self.image_prep = profile_for_model(self._model_name)
         
         self._model = ChatOpenAI(
             model=model_name,
@@ -54,8 +63,9 @@ class BaseLLMAgent:
 
 
     def _encode_image(self, image_path: Path| str) -> str:
-        with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+        """Return a `data:` URL for the screenshot, resized and re-encoded per `image_prep`."""
+        mime, b64 = default_preprocessor.encode(image_path, self.image_prep)
+        return f"data:{mime};base64,{b64}"
 
 
     def _strip_fences(self, text: str) -> str:
@@ -75,14 +85,29 @@ class BaseLLMAgent:
         text + image; otherwise fall back to text-only.  Always returns a dict
         parsed from the model’s JSON output.
         """
+        use_images = bool(screenshots and self._processor)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(
+                model=self._model_name,
+                system_prompt=(system_prompt or self.system_prompt) if use_images else self.system_prompt,
+                user_text=user_text,
+                screenshots=screenshots if use_images else None,
+                temperature=self.temperature,
+                response_format=self.response_format,
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         img_blocks = []
-        if screenshots and self._processor:
+        if use_images:
             if len(screenshots) > 2:
                 raise ValueError("Pass at most 2 screenshots")
             for path in screenshots:
                 img_blocks.append(
                     {"type": "image",
-                    "image": f"data:image/png;base64,{self._b64(path)}"}
+                    "image": self._encode_image(path)}
                 )
 
             user_block = img_blocks + [{"type": "text", "text": user_text.strip()}]
@@ -112,9 +137,12 @@ class BaseLLMAgent:
         # Same JSON-parsing logic you already had:
         text_out = getattr(raw, "content", raw).strip()
         try:
-            return json.loads(self._strip_fences(text_out))
+            result = json.loads(self._strip_fences(text_out))
         except json.JSONDecodeError as e:
             raise ValueError(f"Model output not valid JSON:\n{text_out}") from e
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
         
     """
     def _call(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -1,16 +1,15 @@
 from __future__ import annotations
 
-import json
 import logging
 import os
 import sys
-import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Literal, Optional
 
 from selenium import webdriver
-from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -20,24 +19,111 @@ from selenium.webdriver.common.actions.action_builder import ActionBuilder
 
 # Omniparser import 
 from Omniparser_Usage.api import process_image
+from .page_settle import PageSettleDetector, SettleResult
+from .capture import CaptureFormat, CdpCapture, Clip
 
 
 ActionType = Literal[
     "click", "double_click", "right_click",
-    "hover", "type", "key", "scroll", "wait"
+    "hover", "type", "key", "scroll", "wait",
+    "sequence",
     ]
   
+SETTLE_LOG_SIZE = 100
+
+# Rendering defaults for headless runs: a fixed viewport without animations
+# gives cheap, reproducible frames.
+HEADLESS_RENDERING: Dict[str, Any] = {
+    "viewport": (1280, 800),
+    "device_scale_factor": 1,
+    "disable_animations": True,
+}
+
 def ts() -> str:
     """Formatted timestamp."""
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
+# Installs (once per document) page instrumentation and reports it with the
+# URL: a document id (new document → new id, so reloads of the same URL are
+# detected), a DOM mutation counter with the time of the last mutation, and
+# network activity (the age of each in-flight fetch/XHR plus the end of the
+# last resource load from the Performance timeline; media element loads are
+# not counted) and whether any audio/video is playing.  Times are ms since the
+# last change.
+_PAGE_PROBE_JS = """
+if (!window.__taProbe) {
+    var p = window.__taProbe = {docId: Math.random().toString(36).slice(2),
+                                mutations: 0, lastMutation: performance.now(),
+                                pending: {}, nextReq: 0, lastResource: 0};
+    new MutationObserver(function (records) {
+        p.mutations += records.length;
+        p.lastMutation = performance.now();
+    }).observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    try {
+        new PerformanceObserver(function (list) {
+            list.getEntries().forEach(function (e) {
+                if (e.initiatorType === "video" || e.initiatorType === "audio") return;
+                p.lastResource = Math.max(p.lastResource, e.responseEnd || e.startTime);
+            });
+        }).observe({type: "resource", buffered: true});
+    } catch (e) {}
+    if (window.fetch) {
+        var origFetch = window.fetch;
+        window.fetch = function () {
+            var id = p.nextReq++;
+            p.pending[id] = performance.now();
+            return origFetch.apply(this, arguments).finally(function () {
+                delete p.pending[id]; p.lastResource = performance.now();
+            });
+        };
+    }
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        var id = p.nextReq++;
+        p.pending[id] = performance.now();
+        this.addEventListener("loadend", function () {
+            delete p.pending[id]; p.lastResource = performance.now();
+        });
+        return origSend.apply(this, arguments);
+    };
+}
+var p = window.__taProbe, now = performance.now();
+var ages = Object.keys(p.pending).map(function (k) { return now - p.pending[k]; });
+var media = Array.prototype.some.call(document.querySelectorAll("video, audio"), function (m) {
+    return !m.paused && !m.ended && m.readyState > 2;
+});
+return {url: location.href, readyState: document.readyState,
+        docId: p.docId, mutations: p.mutations,
+        sinceMutation: now - p.lastMutation,
+        inflight: ages.length, inflightAges: ages,
+        sinceResource: now - p.lastResource, mediaPlaying: media,
+        vw: window.innerWidth, vh: window.innerHeight,
+        sx: window.scrollX, sy: window.scrollY};
+"""
+
 class BrowserAgent:
     def __init__(self, driver: Optional[webdriver.Chrome] = None, *, config: Optional[Dict[str, Any]] = None, ) -> None:
         self.driver = driver
         # configuration
+        headless = (config or {}).get("headless", os.environ.get("BROWSER_HEADLESS", "") == "1")
         default_config: Dict[str, Any] = {
             "screenshot_dir": "./screenshots",
             "wait_timeout": 15,
+            "settle_timeout": 5,        # upper bound for wait_for_settle (s); the old fixed sleep
+            "settle_quiet_ms": 500,     # DOM/network quiet period counted as settled
+            "settle_max_mutation_rate": 5,   # DOM mutations/s still counted as settled (tickers, clocks)
+            "settle_long_request_ms": 3000,  # fetch/XHR open longer than this (long polls, streams) is ignored
+            "settle_check_pixels": True,
+            "user_data_dir": None,      # Chrome profile dir; set per session to isolate cookies/cache
+            # rendering: headed runs keep a maximised window with animations on
+            # unless configured; headless runs get HEADLESS_RENDERING
+            "headless": headless,
+            "viewport": None,           # CSS px (w, h); None → maximised window (headed only)
+            "device_scale_factor": None,
+            "disable_animations": False,
+            **(HEADLESS_RENDERING if headless else {}),
+            "capture_backend": "cdp",   # "cdp" (Page.captureScreenshot) | "webdriver"
+            "cdp_max_failures": 3,      # consecutive CDP failures before this driver uses WebDriver capture
             "log_level": "INFO",
         }
         self.config = default_config | (config or {})
@@ -46,12 +132,28 @@ class BrowserAgent:
         self.context: Dict[str, Any] = {
             "previous_actions": [],
             "session_id": ts(),
+            "epoch": 0,             # bumped by anything that may change the page
+            "shots": 0,
+            "settle_log": deque(maxlen=SETTLE_LOG_SIZE),   # most recent wait_for_settle results
         }
 
         self._ensure_dirs()
         self._setup_logging()
 
         self.wait = WebDriverWait(self.driver, self.config["wait_timeout"])
+        # viewport geometry {w, h, sx, sy}; refreshed for free by every page_probe
+        # and dropped on scroll/navigation, so actions rarely need to fetch it
+        self._viewport: Optional[Dict[str, float]] = None
+        self.capture = CdpCapture(lambda: self.driver)
+        self._cdp_failures = 0      # consecutive; reset by a success or a new driver
+        self.settle = PageSettleDetector(
+            probe=self.page_probe,
+            grab=self._grab_for_stability,
+            quiet_ms=self.config["settle_quiet_ms"],
+            max_mutation_rate=self.config["settle_max_mutation_rate"],
+            long_request_ms=self.config["settle_long_request_ms"],
+            check_pixels=self.config["settle_check_pixels"],
+        )
 
         logging.info("BrowserAgent initialised.")
 
@@ -71,53 +173,137 @@ class BrowserAgent:
     # Open URL
     
     def open(self, url: str):
-        if self.driver is None:
-            opts = Options()
-            #opts.add_argument("--headless=new")
-            #opts.add_argument("--window-size=1280,1000")
-            self.driver = webdriver.Chrome(options=opts)  
-
+        self._ensure_driver()
         self.driver.get(url) 
-        self.driver.maximize_window()
-        time.sleep(2)  # quick’n’dirty wait; replace with WebDriverWait
+        self.context["epoch"] += 1
+        self._viewport = None
+        if self.config["viewport"] is None and not self._headless:
+            self.driver.maximize_window()
+        self.wait_for_settle(reason="open")
                     
           
+    def close(self) -> None:
+        """Quit the browser session, if one is open."""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            finally:
+                self.driver = None
+
+    @property
+    def _headless(self) -> bool:
+        return bool(self.config["headless"])
+
+    def _build_options(self) -> Options:
+        opts = Options()
+        if self._headless:
+            opts.add_argument("--headless=new")
+            opts.add_argument("--disable-gpu")
+            opts.add_argument("--disable-dev-shm-usage")
+            opts.add_argument("--hide-scrollbars")
+            opts.add_argument("--mute-audio")
+        if self.config["viewport"] is not None:
+            w, h = self.config["viewport"]
+            opts.add_argument(f"--window-size={w},{h}")
+        if self.config["device_scale_factor"] is not None:
+            opts.add_argument(f"--force-device-scale-factor={self.config['device_scale_factor']}")
+        if self.config["user_data_dir"]:
+            opts.add_argument(f"--user-data-dir={self.config['user_data_dir']}")
+        return opts
+
     def _ensure_driver(self):
         if self.driver is None:
-            opts = Options()
-            if self._headless:
-                opts.add_argument("--headless=new")
-            opts.add_argument("--window-size=1280,1000")
-            self.driver = webdriver.Chrome(options=opts)
+            self.driver = webdriver.Chrome(options=self._build_options())
+            self._cdp_failures = 0
+            self._apply_rendering_overrides()
+
+    def _apply_rendering_overrides(self) -> None:
+        """Pin the viewport exactly (window size includes browser chrome) and switch off animations."""
+        if self.config["viewport"] is not None:
+            w, h = self.config["viewport"]
+            self.driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+                "width": w, "height": h,
+                "deviceScaleFactor": self.config["device_scale_factor"] or 0,
+                "mobile": False,
+            })
+        if self.config["disable_animations"]:
+            self.driver.execute_cdp_cmd("Emulation.setEmulatedMedia", {
+                "features": [{"name": "prefers-reduced-motion", "value": "reduce"}],
+            })
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": """
+                document.addEventListener("DOMContentLoaded", function () {
+                    var s = document.createElement("style");
+                    s.textContent = "*, *::before, *::after { animation: none !important;" +
+                                    " transition: none !important; caret-color: transparent !important; }";
+                    document.head.appendChild(s);
+                });
+            """})
 
     # Take screenshot 
-    def take_screenshot(self) -> Path:
+    def take_screenshot(
+        self,
+        fmt: CaptureFormat = "png",
+        *,
+        quality: Optional[int] = None,
+        clip: Optional[Clip] = None,
+    ) -> Path:
+        """
+        Save the viewport (or `clip` = (x, y, w, h) in CSS px) to disk.
+        PNG is what OmniParser expects; JPEG/WebP with `quality` are much
+        cheaper for LLM-facing copies.  Non-PNG formats and clips need the
+        CDP backend.
+        """
         if self.driver is None:
-            self.driver = webdriver.Chrome
+            self._ensure_driver()
             print("Auto-created Chrome driver!")
+        self.context["shots"] += 1
         fname = (
             Path(self.config["screenshot_dir"])
-            / f"screen_{self.context['session_id']}_{ts()}.png"
+            / f"screen_{self.context['session_id']}_{ts()}_{self.context['shots']:04d}.{fmt}"
         )
-        self.driver.save_screenshot(fname)
+        captured = False
+        if self._use_cdp():
+            try:
+                self.capture.capture(fname, fmt, quality=quality, clip=clip)
+                self._cdp_failures, captured = 0, True
+            except Exception as exc:          # e.g. non-Chromium driver
+                self._cdp_failed(exc)
+        if not captured:
+            if fmt != "png" or clip is not None:
+                raise ValueError("WebDriver capture only supports full-viewport PNG")
+            self.driver.save_screenshot(fname)
         logging.info("Screenshot saved → %s", fname)
         print(f"Screenshot saved → {fname}")
         return fname
 
+    def _grab_for_stability(self) -> bytes:
+        """Small, cheap frame used only to compare consecutive screens."""
+        if self._use_cdp():
+            try:
+                frame = self.capture.grab("jpeg", quality=30)
+                self._cdp_failures = 0
+                return frame
+            except Exception as exc:
+                self._cdp_failed(exc)
+        return self.driver.get_screenshot_as_png()
+
+    def _use_cdp(self) -> bool:
+        return (
+            self.config["capture_backend"] == "cdp"
+            and self._cdp_failures < self.config["cdp_max_failures"]
+        )
+
+    def _cdp_failed(self, exc: Exception) -> None:
+        """Fall back to WebDriver for this call; after `cdp_max_failures` in a row, for this driver."""
+        self._cdp_failures += 1
+        logging.warning("CDP capture failed (%s, %d in a row); falling back to WebDriver",
+                        exc, self._cdp_failures)
+
     def _run_omniparser(self, img_path: Path) -> Dict[str, Any]:
         try:
             result = process_image(str(img_path))
             logging.info("OmniParser returned %s keys", len(result))
-            os.makedirs("parser", exist_ok=True)
-
-           
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = Path(f"parser/parsed_output_{timestamp}.json")
-
-            # Save result as JSON
-            with output_path.open("w") as f:
-                json.dump(result, f, indent=2)
-            logging.info("OmniParser output saved to %s", output_path)
+            # persisted per step by the run's ParseStore (see agent/parse_store.py)
             return result
         except Exception as exc:
             logging.error("OmniParser failed: %s", exc)
@@ -131,34 +317,67 @@ class BrowserAgent:
         elif request == "back":
             self.driver.back()
             logging.info("Navigated back to the previous page.")
-        time.sleep(5)
+        self.context["epoch"] += 1
+        self._viewport = None
+        self.wait_for_settle(reason=f"refresh_or_go_back:{request}")
+
+    def wait_for_settle(self, timeout: float | None = None, *, reason: str = "") -> SettleResult:
+        """Block until the page is stable (or `timeout`), and record how long it took."""
+        if timeout is None:
+            timeout = self.config["settle_timeout"]
+        result = self.settle.wait(timeout)
+        self.context["settle_log"].append({"reason": reason, **result.as_dict()})
+        logging.info("Page settle [%s]: %.2fs (%s)", reason, result.waited_s, result.outcome)
+        return result
+
+    def page_probe(self) -> Dict[str, Any]:
+        """Cheap page fingerprint: URL, readyState, document id, DOM mutation count, viewport."""
+        probe = self.driver.execute_script(_PAGE_PROBE_JS)
+        if probe:
+            self._viewport = {"w": probe["vw"], "h": probe["vh"], "sx": probe["sx"], "sy": probe["sy"]}
+        return probe
+
+    def viewport(self) -> Dict[str, float]:
+        """Cached viewport geometry; one script call when the cache is empty."""
+        if self._viewport is None:
+            w, h, sx, sy = self.driver.execute_script(
+                "return [window.innerWidth, window.innerHeight, window.scrollX, window.scrollY];"
+            )
+            self._viewport = {"w": w, "h": h, "sx": sx, "sy": sy}
+        return self._viewport
     
     def _ensure_in_viewport(self, x: int, y: int) -> None:
-        vw, vh = self.driver.execute_script(
-            "return [window.innerWidth, window.innerHeight];"
-        )
+        vp = self.viewport()
+        vw, vh = vp["w"], vp["h"]
         if not (0 <= x <= vw and 0 <= y <= vh):
             raise ValueError(f"Target ({x},{y}) outside viewport {vw}×{vh}")
 
-    def _click_at(self, x: int, y: int) -> None:
-        """Absolute single click using W3C actions."""
+    def _pointer_at(self, x: int, y: int, kind: str = "click") -> None:
+        """
+        Absolute pointer action at viewport (x,y) using W3C actions, sent as a
+        single perform() round trip. kind: click | double_click | right_click | move.
+        """
         self._ensure_in_viewport(x, y)
         actions = ActionBuilder(                       # W3C-level builder
             self.driver,
             mouse=PointerInput("mouse", "mouse"),
         )
         actions.pointer_action.move_to_location(x, y)
-        actions.pointer_action.click()
+        if kind == "click":
+            actions.pointer_action.click()
+        elif kind == "double_click":
+            actions.pointer_action.double_click()
+        elif kind == "right_click":
+            actions.pointer_action.context_click()
         actions.perform()
 
+    def _click_at(self, x: int, y: int) -> None:
+        """Absolute single click using W3C actions."""
+        self._pointer_at(x, y, "click")
+
     def _move_to(self, x: int, y: int) -> None:
-        """Move pointer to absolute (x,y) without clicking (uses ActionChains)."""
-        self._ensure_in_viewport(x, y)
-        body = self.driver.find_element(By.TAG_NAME, "body")
-        ActionChains(self.driver) \
-            .move_to_element_with_offset(body, 0, 0) \
-            .move_by_offset(x, y) \
-            .perform()
+        """Move pointer to absolute (x,y) without clicking."""
+        self._pointer_at(x, y, "move")
 
     # -------------------------------------------------------------------------
     # Helper to convert bbox → pixel centre (kept unchanged)
@@ -168,9 +387,8 @@ class BrowserAgent:
         `bbox` is [x1, y1, x2, y2] in **normalised** (0-1) coordinates.
         Returns pixel (x,y) of the rectangle centre.
         """
-        vw, vh = self.driver.execute_script(
-            "return [window.innerWidth, window.innerHeight];"
-        )
+        vp = self.viewport()
+        vw, vh = vp["w"], vp["h"]
         x1, y1, x2, y2 = bbox
         cx = int(((x1 + x2) / 2) * vw)
         cy = int(((y1 + y2) / 2) * vh)
@@ -185,6 +403,7 @@ class BrowserAgent:
         """
         kind: ActionType = action["action"]
         res = {"success": True, "action": action}
+        self.context["epoch"] += 1
 
         try:
             # ----------------------------------------------------------
@@ -198,7 +417,6 @@ class BrowserAgent:
             # ----------------------------------------------------------
             if kind == "click":
                 self._click_at(vx, vy)
-                time.sleep(5)
             elif kind == "type":
                 self._click_at(vx, vy)                      # focus first
                 active = self.driver.switch_to.active_element
@@ -212,22 +430,13 @@ class BrowserAgent:
                 dx = int(action.get("dx", 0))
                 dy = int(action.get("dy", 0))
                 self.driver.execute_script("window.scrollBy(arguments[0],arguments[1]);", dx, dy)
+                self._viewport = None
 
             elif kind == "double_click":
-                body = self.driver.find_element(By.TAG_NAME, "body")
-                ActionChains(self.driver) \
-                    .move_to_element_with_offset(body, 0, 0) \
-                    .move_by_offset(vx, vy) \
-                    .double_click() \
-                    .perform()
+                self._pointer_at(vx, vy, "double_click")
 
             elif kind == "right_click":
-                body = self.driver.find_element(By.TAG_NAME, "body")
-                ActionChains(self.driver) \
-                    .move_to_element_with_offset(body, 0, 0) \
-                    .move_by_offset(vx, vy) \
-                    .context_click() \
-                    .perform()
+                self._pointer_at(vx, vy, "right_click")
 
             elif kind == "hover":
                 self._move_to(vx, vy)
@@ -238,14 +447,25 @@ class BrowserAgent:
 
 
             elif kind == "key":
-                self.driver.switch_to.active_element.send_keys(action["key"])
+                self.driver.switch_to.active_element.send_keys(self._key(action["key"]))
 
             elif kind == "wait":
-                time.sleep(action.get("seconds", 1))
+                self.wait_for_settle(float(action.get("seconds", 1)), reason="wait")
+
+            # ----------------------------------------------------------
+            # Composite macro
+            # ----------------------------------------------------------
+            elif kind == "sequence":
+                res["steps"] = self._execute_sequence(action)
 
             else:
                 raise ValueError(f"Unknown action: {kind}")
 
+            # every input can start navigation or re-render (`wait` and
+            # `sequence` settle themselves)
+            if kind not in ("wait", "sequence"):
+                self.wait_for_settle(reason=kind)
+
         # --------------------------------------------------------------
         # Error handling
         # --------------------------------------------------------------
@@ -253,6 +473,88 @@ class BrowserAgent:
             logging.error("Action failed: %s", exc, exc_info=True)
             res.update(success=False, error=str(exc))
 
+        return res
+
+    # -------------------------------------------------------------------------
+    # Composite actions
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _key(name: str) -> str:
+        """
+        'Enter' / 'ENTER' / 'page_down' → selenium Keys value; other text as-is.
+        Used for both top-level `key` actions and `key` steps in a sequence.
+        """
+        return getattr(Keys, name.upper().replace(" ", "_"), name)
+
+    def _execute_sequence(self, action: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Runs `action["steps"]` – an ordered list of primitive actions (click,
+        double_click, right_click, hover, type, key, scroll, wait) – as one
+        W3C action chain, i.e. a single WebDriver round trip.
+
+        The chain is only flushed early for a `wait` step (which settles the
+        page for at most `seconds`) or a step with `"settle": true`;
+        `"settle_between": true` on the macro settles after every step.  The
+        page is settled once at the end.
+        Returns one {"action", "flushed"} entry per step.
+        """
+        steps = action.get("steps") or []
+        if not steps:
+            raise ValueError("sequence has no steps")
+        settle_between = bool(action.get("settle_between", False))
+        chain = ActionChains(self.driver)
+        pending = False
+        done: List[Dict[str, Any]] = []
+
+        def flush(reason: str, timeout: float | None = None) -> None:
+            nonlocal chain, pending
+            if pending:
+                chain.perform()
+                chain, pending = ActionChains(self.driver), False
+            self.wait_for_settle(timeout, reason=reason)
+
+        for i, step in enumerate(steps):
+            kind = step["action"]
+            if kind == "wait":
+                flush(f"sequence[{i}]:wait", float(step.get("seconds", 1)))
+                done.append({"action": kind, "flushed": True})
+                continue
+
+            if kind in ("click", "double_click", "right_click", "hover", "type"):
+                vx, vy = self._viewport_point(step["bbox"])
+                self._ensure_in_viewport(vx, vy)
+                # raw W3C move (absolute viewport coords); pause the key track
+                # for the same tick, as ActionChains' own methods do, so later
+                # key presses do not land in the same tick as a pointer action
+                chain.w3c_actions.pointer_action.move_to_location(vx, vy)
+                chain.w3c_actions.key_action.pause()
+                if kind in ("click", "type"):
+                    chain.click()
+                elif kind == "double_click":
+                    chain.double_click()
+                elif kind == "right_click":
+                    chain.context_click()
+                if kind == "type":               # replace the field's content
+                    chain.key_down(Keys.CONTROL).send_keys("a").key_up(Keys.CONTROL)
+                    chain.send_keys(Keys.BACKSPACE, step.get("text", ""))
+            elif kind == "key":
+                chain.send_keys(self._key(step["key"]))
+            elif kind == "scroll":
+                chain.scroll_by_amount(int(step.get("dx", 0)), int(step.get("dy", 0)))
+            else:
+                raise ValueError(f"Unknown action in sequence: {kind}")
+            pending = True
+
+            flushed = (settle_between or bool(step.get("settle"))) and i < len(steps) - 1
+            if flushed:
+                flush(f"sequence[{i}]:{kind}")
+            done.append({"action": kind, "flushed": flushed})
+
+        if pending:
+            chain.perform()
+        self._viewport = None
+        self.wait_for_settle(reason="sequence")
+        return done
         
 
 """
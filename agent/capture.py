@@ -0,0 +1,79 @@
+"""Screenshot capture backends for BrowserAgent: WebDriver and CDP."""
+
+from __future__ import annotations
+
+import base64
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Literal, Optional, Tuple
+
+CaptureFormat = Literal["png", "jpeg", "webp"]
+Clip = Tuple[float, float, float, float]      # x, y, width, height in CSS px
+
+
+class CdpCapture:
+    """
+    Captures via `Page.captureScreenshot`, skipping WebDriver's screenshot
+    endpoint.  Supports JPEG/WebP output (with quality) and clip rectangles,
+    so a consumer can fetch just the region and encoding it needs.
+    """
+
+    def __init__(self, get_driver: Callable[[], Any]) -> None:
+        self._get_driver = get_driver
+
+    def grab(
+        self,
+        fmt: CaptureFormat = "png",
+        *,
+        quality: Optional[int] = None,
+        clip: Optional[Clip] = None,
+    ) -> bytes:
+        params: Dict[str, Any] = {"format": fmt, "captureBeyondViewport": False}
+        if quality is not None and fmt != "png":
+            params["quality"] = quality
+        if clip is not None:
+            x, y, w, h = clip
+            params["clip"] = {"x": x, "y": y, "width": w, "height": h, "scale": 1}
+        data = self._get_driver().execute_cdp_cmd("Page.captureScreenshot", params)["data"]
+        return base64.b64decode(data)
+
+    def capture(self, path: Path, fmt: CaptureFormat = "png", **kwargs: Any) -> Path:
+        path.write_bytes(self.grab(fmt, **kwargs))
+        return path
+
+
+def benchmark(driver: Any, n: int = 10) -> Dict[str, Dict[str, float]]:
+    """
+    Compare capture latency and size: WebDriver PNG vs CDP PNG/JPEG/WebP.
+
+    Returns {variant: {"median_ms", "p90_ms", "bytes"}} measured over `n` shots
+    of the current page.
+    """
+    cdp = CdpCapture(lambda: driver)
+    variants: Dict[str, Callable[[], bytes]] = {
+        "webdriver_png": driver.get_screenshot_as_png,
+        "cdp_png": lambda: cdp.grab("png"),
+        "cdp_jpeg_80": lambda: cdp.grab("jpeg", quality=80),
+        "cdp_webp_80": lambda: cdp.grab("webp", quality=80),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        # include the file write the agent pays for on every step
+        out = Path(tmp) / "shot"
+        results: Dict[str, Dict[str, float]] = {}
+        for name, grab in variants.items():
+            times, size = [], 0
+            for _ in range(n):
+                t0 = time.perf_counter()
+                data = grab()
+                out.write_bytes(data)
+                times.append((time.perf_counter() - t0) * 1000)
+                size = len(data)
+            times.sort()
+            results[name] = {
+                "median_ms": round(statistics.median(times), 1),
+                "p90_ms": round(times[int(0.9 * (len(times) - 1))], 1),
+                "bytes": size,
+            }
+    return results
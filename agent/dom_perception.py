@@ -0,0 +1,105 @@
+"""DOM-based perception: interactive elements straight from the live page."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+# One round trip: every visible, unoccluded interactive element in the
+# viewport with an accessible name and a viewport-normalised bbox, plus the
+# regions the DOM cannot see into (canvas, iframes, embeds, video).
+_DOM_ELEMENTS_JS = r"""
+var W = window.innerWidth, H = window.innerHeight;
+var SEL = 'a[href],button,input:not([type=hidden]),select,textarea,summary,label[for],' +
+          '[role=button],[role=link],[role=tab],[role=menuitem],[role=checkbox],[role=radio],' +
+          '[role=switch],[role=option],[role=combobox],[role=searchbox],[role=textbox],' +
+          '[onclick],[contenteditable=""],[contenteditable=true],[tabindex]:not([tabindex="-1"])';
+
+function box(r) {
+    return [Math.max(r.left, 0) / W, Math.max(r.top, 0) / H,
+            Math.min(r.right, W) / W, Math.min(r.bottom, H) / H];
+}
+function visible(el, r) {
+    if (r.width < 4 || r.height < 4) return false;
+    if (r.bottom <= 0 || r.right <= 0 || r.top >= H || r.left >= W) return false;
+    var cs = getComputedStyle(el);
+    return cs.visibility !== 'hidden' && cs.display !== 'none' && +cs.opacity !== 0;
+}
+function name(el) {
+    var img = el.querySelector && el.querySelector('img[alt]');
+    var n = el.getAttribute('aria-label') || el.innerText || el.value || el.placeholder ||
+            el.title || el.alt || (img && img.alt) || '';
+    return String(n).trim().replace(/\s+/g, ' ').slice(0, 120);
+}
+
+var elements = [], seen = {};
+document.querySelectorAll(SEL).forEach(function (el) {
+    var r = el.getBoundingClientRect();
+    if (!visible(el, r)) return;
+    var cx = Math.min(Math.max((r.left + r.right) / 2, 0), W - 1);
+    var cy = Math.min(Math.max((r.top + r.bottom) / 2, 0), H - 1);
+    var hit = document.elementFromPoint(cx, cy);
+    if (hit && hit !== el && !el.contains(hit) && !hit.contains(el)) return;   // covered
+    var b = box(r), n = name(el);
+    var key = b.map(function (v) { return v.toFixed(3); }).join(',') + '|' + n;
+    if (seen[key]) return;
+    seen[key] = 1;
+    elements.push({tag: el.tagName.toLowerCase(), role: el.getAttribute('role') || '', name: n, bbox: b});
+});
+
+var opaque = [];
+document.querySelectorAll('canvas,iframe,embed,object,video').forEach(function (el) {
+    var r = el.getBoundingClientRect();
+    if (visible(el, r) && r.width >= 32 && r.height >= 32) opaque.push(box(r));
+});
+return {elements: elements, opaque: opaque};
+"""
+
+
+def _area(b: List[float]) -> float:
+    return max(b[2] - b[0], 0) * max(b[3] - b[1], 0)
+
+
+def _centre_in(bbox: List[float], region: List[float]) -> bool:
+    cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return region[0] <= cx <= region[2] and region[1] <= cy <= region[3]
+
+
+def extract_dom_elements(driver: Any) -> Dict[str, Any]:
+    """
+    Return {"elements": [...], "opaque": [bbox, ...], "opaque_ratio": float}.
+
+    Elements follow the OmniParser schema used by `process_image`
+    (type/bbox/interactivity/content/source), with source "dom".
+    """
+    raw = driver.execute_script(_DOM_ELEMENTS_JS) or {}
+    elements = [
+        {
+            "type": "icon",
+            "bbox": e["bbox"],
+            "interactivity": True,
+            "content": e["name"] or f"<{e['role'] or e['tag']}>",
+            "source": "dom",
+        }
+        for e in raw.get("elements", [])
+    ]
+    opaque = raw.get("opaque", [])
+    return {
+        "elements": elements,
+        "opaque": opaque,
+        "opaque_ratio": min(sum(_area(b) for b in opaque), 1.0),
+    }
+
+
+def fuse(dom: Dict[str, Any], vision_elements: List[Dict[str, Any]] | None) -> List[Dict[str, Any]]:
+    """
+    DOM elements plus the vision elements that fall inside opaque regions
+    (canvas/iframe/…), renumbered with sequential ids.
+    """
+    merged = list(dom["elements"])
+    if vision_elements:
+        merged += [
+            {k: v for k, v in e.items() if k != "id"}
+            for e in vision_elements
+            if any(_centre_in(e["bbox"], region) for region in dom["opaque"])
+        ]
+    return [{"id": i, **e} for i, e in enumerate(merged)]
@@ -1,5 +1,9 @@
 from __future__ import annotations
-import json, time
+import contextvars, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any
 from typing import List, Dict, Literal, Optional
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph               
@@ -10,17 +14,69 @@ from .browser_agent    import BrowserAgent
 from .planner_agent    import PlannerAgent
 from .action_agent     import ActionAgent
 from .evaluation_agent import EvaluationAgent
+from .llm_cache        import LLMResponseCache
+from .perception       import Perception, PerceptionManager
+from .parse_store      import ParseStore
 from run_logger import log_agent
 from pathlib import Path
 
-browser   = BrowserAgent()
-planner   = PlannerAgent()
-actor     = ActionAgent()
-evaluator = EvaluationAgent()
+llm_cache = LLMResponseCache.from_env()   # None unless LLM_CACHE_MODE is set
+
+# LLM agents are stateless between calls, so every run shares them (and their
+# HTTP connection pools); each run gets its own browser and perception state.
+planner   = PlannerAgent(cache=llm_cache)
+actor     = ActionAgent(cache=llm_cache)
+evaluator = EvaluationAgent(cache=llm_cache)
+
+# "serial" runs one node at a time; "overlap" evaluates and speculatively
+# decides the next action concurrently (see perceive_and_evaluate).
+PIPELINE_MODE = os.environ.get("AGENT_PIPELINE_MODE", "serial")
+# In overlap mode, whether to speculatively decide the next action. A rolled-back
+# speculation that already started is still a full (paid) LLM call.
+SPECULATE = os.environ.get("AGENT_SPECULATE", "1") == "1"
+# "vision" (OmniParser), "dom" or "hybrid"; see PerceptionManager.
+PERCEPTION_MODE = os.environ.get("AGENT_PERCEPTION_MODE", "vision")
+
+_overlap_pool: Optional[ThreadPoolExecutor] = None   # created on first use (overlap mode only)
+_overlap_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _overlap_pool
+    with _overlap_pool_lock:
+        if _overlap_pool is None:
+            _overlap_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="overlap")
+        return _overlap_pool
+
+
+@dataclass
+class WorkflowContext:
+    """Everything a run's graph nodes act on."""
+    browser: BrowserAgent
+    planner: PlannerAgent = field(default_factory=lambda: planner)
+    actor: ActionAgent = field(default_factory=lambda: actor)
+    evaluator: EvaluationAgent = field(default_factory=lambda: evaluator)
+    mode: str = PIPELINE_MODE
+    speculate: bool = SPECULATE
+    perception_mode: str = PERCEPTION_MODE
+    perception: PerceptionManager = field(init=False)
+    parse_store: Optional[ParseStore] = None     # set per run by main._drive
+
+    def __post_init__(self) -> None:
+        self.perception = PerceptionManager(self.browser, mode=self.perception_mode)
+
+
+def new_context(browser_config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> WorkflowContext:
+    """Context with a fresh BrowserAgent and the shared LLM agents."""
+    return WorkflowContext(browser=BrowserAgent(config=browser_config), **kwargs)
 
 class CycleState(BaseModel):
     task: str
     app_name: str = ""
+    run_id: str = ""
+    start_url: str = ""
+    current_url: str = ""   # page the browser was on at the last update_state (used by resume)
+    last_node: str = ""
     plan: List[Dict]        = Field(default_factory=list)
     step_idx: int           = 0
 
@@ -39,26 +95,32 @@ class CycleState(BaseModel):
     explanation: str = ""
     fix: str = ""
     request: str = ""
+    # next step's action, decided on img_after while evaluation was pending
+    speculative_action: Optional[Dict] = None
+    last_update_ts: float = 0.0
 
 # ── Node implementations ─────────────────────────────────────────────────────
-def perceive_before(state: CycleState) -> CycleState:
-    img = browser.take_screenshot()
-    state.ui_before = browser._run_omniparser(img).get("elements", [])
-    state.img_before = img
+def _record_parse(state: CycleState, ctx: WorkflowContext, p: Perception, node: str) -> None:
+    if ctx.parse_store is not None:
+        ctx.parse_store.record(state.step_idx, p.screen_hash, p.elements, node=node, img=p.img)
+
+def perceive_before(state: CycleState, ctx: WorkflowContext) -> CycleState:
+    p = ctx.perception.perceive()
+    state.ui_before, state.img_before = p.elements, p.img
+    _record_parse(state, ctx, p, "perceive_before")
     return state
 
-def perceive_after(state: CycleState) -> CycleState:
-    
-    img = browser.take_screenshot()
-    state.ui_after = browser._run_omniparser(img).get("elements", [])
-    state.img_after = img
+def perceive_after(state: CycleState, ctx: WorkflowContext) -> CycleState:
+    p = ctx.perception.perceive()
+    state.ui_after, state.img_after = p.elements, p.img
+    _record_parse(state, ctx, p, "perceive_after")
     return state
 
-def tentative_plan(state: CycleState) -> CycleState:
+def tentative_plan(state: CycleState, ctx: WorkflowContext) -> CycleState:
     """Generate or repair a plan."""
     print("call here 1")
     if not state.plan:
-        state.plan = planner.plan(
+        state.plan = ctx.planner.plan(
             app_name = state.app_name,
             user_task = state.task,
             entities  = state.ui_before,
@@ -68,8 +130,10 @@ def tentative_plan(state: CycleState) -> CycleState:
         state.step_idx = 0
         #log_agent("planner", state.step_idx, state.plan, str(state.img_before), str(state.img_after))
     elif state.status == "plan_problem" :
-        browser.refresh_or_go_back(state.request)  # refresh or go back to the previous step
-        state.plan = planner.repair_plan(
+        state.speculative_action = None
+        ctx.browser.refresh_or_go_back(state.request)  # refresh or go back to the previous step
+        perceive_before(state, ctx)                   # repair against the live page, not the stale one
+        state.plan = ctx.planner.repair_plan(
             app_name     = state.app_name,
             user_task    = state.task,
             step_idx     = state.step_idx,
@@ -83,7 +147,7 @@ def tentative_plan(state: CycleState) -> CycleState:
     state.status = "acting"
     return state
 
-def decide_action(state: CycleState) -> CycleState:
+def decide_action(state: CycleState, ctx: WorkflowContext) -> CycleState:
     """Pick the next low-level action for the current step."""
     # if state.step_idx >= len(state.plan):
     #     state.status = "done"
@@ -92,12 +156,16 @@ def decide_action(state: CycleState) -> CycleState:
     print("step from graph_builder", step)
     if state.status == "action_problem":
         #move the screen back to the previous state then fix the action
-        browser.refresh_or_go_back(state.request)  # refresh or go back to the previous step
-        state.action = actor.repair_action(step, state.explanation, state.fix ,state.ui_before, screenshots = [state.img_before])  #Create the action agent to repair the action
+        ctx.browser.refresh_or_go_back(state.request)  # refresh or go back to the previous step
+        perceive_before(state, ctx)                   # re-captures only if the page changed
+        state.action = ctx.actor.repair_action(step, state.explanation, state.fix ,state.ui_before, screenshots = [state.img_before])  #Create the action agent to repair the action
         state.status = "acting"
         return state
+    elif state.speculative_action is not None:
+        # decided in perceive_and_evaluate against the same screen, now confirmed
+        state.action, state.speculative_action = state.speculative_action, None
     else:
-        state.action = actor.decide(step, state.ui_before, screenshots = [state.img_before] if state.img_before else None)
+        state.action = ctx.actor.decide(step, state.ui_before, screenshots = [state.img_before] if state.img_before else None)
     
     if state.action is None:
         state.status = "action_problem"
@@ -105,19 +173,27 @@ def decide_action(state: CycleState) -> CycleState:
         state.status = "acting"
     return state
 
-def execute_action(state: CycleState) -> CycleState:
+def execute_action(state: CycleState, ctx: WorkflowContext) -> CycleState:
     try:
-        browser.execute_action(state.action)
-        log_agent("action", state.step_idx, state.action, str(state.img_before), str(state.img_after))
+        result = ctx.browser.execute_action(state.action)
+        log_agent("action", state.step_idx, result, str(state.img_before), str(state.img_after))
         # After execution we immediately capture ui_after in next node
+        if not result.get("success", True):
+            _browser_failed(state, result.get("error", "unknown error"))
     except Exception as exc:
         print(f"Action execution failed: {exc}")
-        state.status = "action_problem"
+        _browser_failed(state, str(exc))
     return state
 
-def evaluate_action(state: CycleState) -> CycleState:
-    """Judge whether the action achieved the step’s intent."""
-    evaluation = evaluator.evaluate(
+def _browser_failed(state: CycleState, error: str) -> None:
+    """The browser could not perform the action; retry it without asking the evaluator."""
+    state.status = "action_problem"
+    state.explanation = f"The browser could not perform the action: {error}"
+    state.fix = "Choose an action the page can perform (check the target element and action type)."
+    state.request = ""
+
+def _evaluate(state: CycleState, ctx: WorkflowContext) -> Dict:
+    return ctx.evaluator.evaluate(
         plan       = state.plan,
         step_idx   = state.step_idx,
         action     = state.action,
@@ -125,7 +201,8 @@ def evaluate_action(state: CycleState) -> CycleState:
         ui_after   = state.ui_after,
         screenshots = [state.img_before, state.img_after] if state.img_after else None
     )
-    
+
+def _apply_evaluation(state: CycleState, evaluation: Dict) -> None:
     match evaluation["result"]:
         case "success":
             state.status = "success"
@@ -138,11 +215,83 @@ def evaluate_action(state: CycleState) -> CycleState:
             state.request = evaluation.get("request", "")
     log_agent("evaluation", state.step_idx, evaluation, str(state.img_before), str(state.img_after))
 
-    
+def evaluate_action(state: CycleState, ctx: WorkflowContext) -> CycleState:
+    """Judge whether the action achieved the step’s intent."""
+    if state.status != "action_problem":    # else execute_action already reported a failure
+        _apply_evaluation(state, _evaluate(state, ctx))
     return state
 
-def update_state(state: CycleState) -> CycleState:
+def perceive_and_evaluate(state: CycleState, ctx: WorkflowContext) -> CycleState:
+    """
+    Overlap-mode replacement for perceive_after → evaluate_action.
+
+    Once ui_after is parsed, the evaluator and a speculative `actor.decide` for
+    the next plan step run concurrently on the post-action screen. The
+    speculative action is kept only if the evaluation is a success (the next
+    step will then act on exactly that screen); otherwise it is discarded. A
+    discarded speculation that had already started still cost a model call and
+    is logged as wasted. Set `ctx.speculate` (AGENT_SPECULATE=0) to turn it off.
+    """
+    t0 = time.perf_counter()
+    perceive_after(state, ctx)
+    t_perceived = time.perf_counter()
+
+    # pool threads run in a copy of this run's context, so anything they log
+    # goes to this run's log (see run_logger)
+    eval_future = None
+    if state.status != "action_problem":    # else execute_action already reported a failure
+        eval_future = _pool().submit(contextvars.copy_context().run, _evaluate, state.model_copy(), ctx)
+    spec_future = None
+    next_idx = state.step_idx + 1
+    if ctx.speculate and state.status != "action_problem" and next_idx < len(state.plan):
+        spec_future = _pool().submit(
+            contextvars.copy_context().run,
+            ctx.actor.decide, state.plan[next_idx], state.ui_after, screenshots=[state.img_after]
+        )
+
+    if eval_future is not None:
+        _apply_evaluation(state, eval_future.result())
+    t_evaluated = time.perf_counter()
+
+    speculation = "none"
+    state.speculative_action = None
+    if spec_future is not None:
+        if state.status == "success":
+            try:
+                state.speculative_action = spec_future.result()
+                speculation = "used"
+            except Exception as exc:
+                print(f"Speculative decide failed, will decide normally: {exc}")
+                speculation = "error"
+        elif spec_future.cancel():
+            speculation = "cancelled"      # never started, nothing spent
+        else:
+            # already running or done: cannot be stopped, so the call is paid
+            # for and its result is ignored
+            speculation = "wasted"
+
+    log_agent("pipeline", state.step_idx, {
+        "perceive_s":  round(t_perceived - t0, 3),
+        "evaluate_s":  round(t_evaluated - t_perceived, 3),
+        "waited_for_speculation_s": round(time.perf_counter() - t_evaluated, 3),
+        "speculation": speculation,
+        "wasted_speculative_call": speculation == "wasted",
+    })
+    return state
+
+def update_state(state: CycleState, ctx: WorkflowContext) -> CycleState:
     """Logic"""
+    now = time.time()
+    if state.last_update_ts:
+        log_agent("timing", state.step_idx, {"mode": ctx.mode, "step_s": round(now - state.last_update_ts, 3)})
+    state.last_update_ts = now
+    if state.status != "success":
+        state.speculative_action = None
+    try:
+        state.current_url = ctx.browser.driver.current_url
+    except Exception:
+        pass
+
     if state.step_idx >= len(state.plan):
             state.status = "done"
 
@@ -167,27 +316,6 @@ def update_state(state: CycleState) -> CycleState:
 
     return state
 
-#build the graph 
-g = StateGraph(CycleState)
-
-g.add_node("perceive_before", perceive_before)
-g.add_node("plan_task",       tentative_plan)
-g.add_node("decide_action",   decide_action)
-g.add_node("execute_action",  execute_action)
-g.add_node("perceive_after",  perceive_after)
-g.add_node("evaluate_action", evaluate_action)
-g.add_node("update_state",    update_state)
-
-g.set_entry_point("perceive_before")
-
-# straight-line backbone
-g.add_edge("perceive_before", "plan_task")
-g.add_edge("plan_task",        "decide_action")
-g.add_edge("decide_action",   "execute_action")
-g.add_edge("execute_action",  "perceive_after")
-g.add_edge("perceive_after",  "evaluate_action")
-g.add_edge("evaluate_action", "update_state")
-
 # conditional routing after bookkeeping
 
 def router(state: CycleState):
@@ -202,9 +330,54 @@ def router(state: CycleState):
         
     }.get(state.status, "__END__")          # safeguard for unknown status
 
-g.add_conditional_edges("update_state", router)
+def _track(name: str, node):
+    """Wrap a node so the state records which node produced it."""
+    def wrapped(state: CycleState) -> CycleState:
+        state = node(state)
+        state.last_node = name
+        return state
+    return wrapped
+
+#build the graph 
+def build_workflow(ctx: WorkflowContext):
+    """Compile the graph with every node bound to `ctx`."""
+    mode = ctx.mode
+    g = StateGraph(CycleState)
+    def add_node(name, fn):
+        g.add_node(name, _track(name, partial(fn, ctx=ctx)))
+
+    add_node("perceive_before", perceive_before)
+    add_node("plan_task",       tentative_plan)
+    add_node("decide_action",   decide_action)
+    add_node("execute_action",  execute_action)
+    add_node("update_state",    update_state)
+
+    g.set_entry_point("perceive_before")
+
+    # straight-line backbone
+    g.add_edge("perceive_before", "plan_task")
+    g.add_edge("plan_task",       "decide_action")
+    g.add_edge("decide_action",   "execute_action")
+    if mode == "overlap":
+        add_node("perceive_and_evaluate", perceive_and_evaluate)
+        g.add_edge("execute_action",        "perceive_and_evaluate")
+        g.add_edge("perceive_and_evaluate", "update_state")
+    elif mode == "serial":
+        add_node("perceive_after",  perceive_after)
+        add_node("evaluate_action", evaluate_action)
+        g.add_edge("execute_action",  "perceive_after")
+        g.add_edge("perceive_after",  "evaluate_action")
+        g.add_edge("evaluate_action", "update_state")
+    else:
+        raise ValueError(f"Unknown pipeline mode: {mode}")
+
+    g.add_conditional_edges("update_state", router)
+    return g.compile()
 
-workflow = g.compile()
+# default single-run context, used by main.py
+default_context = new_context()
+browser  = default_context.browser
+workflow = build_workflow(default_context)
 
 
 
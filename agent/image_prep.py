@@ -0,0 +1,104 @@
+"""Image preparation for multimodal LLM calls: crop, resize, re-encode, cache."""
+
+from __future__ import annotations
+
+import base64
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class ImagePrepConfig:
+    """
+    How a screenshot is turned into an upload payload.
+
+    max_side / max_short_side mirror the provider's own downscaling (there is no
+    point uploading pixels the provider throws away); max_pixels caps the area
+    for models that bill vision tokens per patch.
+    """
+
+    max_side: int | None = 2048
+    max_short_side: int | None = 768
+    max_pixels: int | None = None
+    crop: Tuple[int, int, int, int] | None = None   # (left, top, right, bottom) in pixels
+    format: str = "JPEG"                             # JPEG | WEBP | PNG
+    quality: int = 80
+
+
+# Effective vision resolution per provider family.
+PROFILES: Dict[str, ImagePrepConfig] = {
+    "openai": ImagePrepConfig(max_side=2048, max_short_side=768),
+    "qwen":   ImagePrepConfig(max_side=None, max_short_side=None, max_pixels=1280 * 28 * 28),
+    "raw":    ImagePrepConfig(max_side=None, max_short_side=None, format="PNG"),
+}
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def profile_for_model(model_name: str) -> ImagePrepConfig:
+    """Pick the prep profile that matches a model name."""
+    name = model_name.lower()
+    if "qwen" in name:
+        return PROFILES["qwen"]
+    return PROFILES["openai"]
+
+
+def _target_size(w: int, h: int, cfg: ImagePrepConfig) -> Tuple[int, int]:
+    scale = 1.0
+    if cfg.max_side and max(w, h) > cfg.max_side:
+        scale = min(scale, cfg.max_side / max(w, h))
+    if cfg.max_short_side and min(w, h) * scale > cfg.max_short_side:
+        scale = min(scale, cfg.max_short_side / min(w, h))
+    if cfg.max_pixels and w * h * scale * scale > cfg.max_pixels:
+        scale = min(scale, (cfg.max_pixels / (w * h)) ** 0.5)
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+class ImagePreprocessor:
+    """Encodes screenshots per `ImagePrepConfig` and memoises the result per file version."""
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self._cache: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def encode(self, image_path: Path | str, cfg: ImagePrepConfig) -> Tuple[str, str]:
+        """Return (mime_type, base64_payload) for `image_path` prepared per `cfg`."""
+        st = Path(image_path).stat()
+        key = (str(image_path), st.st_mtime_ns, st.st_size, cfg)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        with Image.open(image_path) as img:
+            if cfg.crop:
+                img = img.crop(cfg.crop)
+            size = _target_size(img.width, img.height, cfg)
+            if size != img.size:
+                img = img.resize(size, Image.LANCZOS)
+            fmt = cfg.format.upper()
+            if fmt in ("JPEG", "WEBP") and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            buf = io.BytesIO()
+            if fmt == "PNG":
+                img.save(buf, format=fmt, optimize=True)
+            else:
+                img.save(buf, format=fmt, quality=cfg.quality)
+
+        entry = (_MIME.get(fmt, "image/png"), base64.b64encode(buf.getvalue()).decode("utf-8"))
+        with self._lock:
+            self._cache[key] = entry
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+
+# shared by every agent in the process
+default_preprocessor = ImagePreprocessor()
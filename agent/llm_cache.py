@@ -0,0 +1,151 @@
+"""LLMResponseCache – content-addressed on-disk cache for deterministic agent calls."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
+
+CacheMode = Literal["off", "read_write", "record", "replay"]
+
+
+class CacheMiss(LookupError):
+    """Raised in `replay` mode when a call has no recorded response."""
+
+
+def _file_digest(path: Path | str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass
+class LLMResponseCache:
+    """
+    Stores parsed model outputs keyed by everything that determines them:
+    model, sampling params, system prompt, user text and screenshot contents.
+
+    Modes:
+        off         – never read or write.
+        read_write  – serve hits, store misses (default).
+        record      – always call the model and overwrite the stored entry.
+        replay      – serve hits only; a miss raises `CacheMiss`.
+    """
+
+    root: Path | str = "runs/llm_cache"
+    mode: CacheMode = "read_write"
+    ttl_s: float | None = 7 * 24 * 3600
+    max_entries: int = 2000
+
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    writes: int = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.root = Path(self.root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMResponseCache"]:
+        """Build a cache from `LLM_CACHE_MODE` / `LLM_CACHE_DIR`; None when unset or off."""
+        mode = os.environ.get("LLM_CACHE_MODE", "off").lower()
+        if mode == "off":
+            return None
+        if mode not in ("read_write", "record", "replay"):
+            raise ValueError(f"Unknown LLM_CACHE_MODE: {mode}")
+        return cls(root=os.environ.get("LLM_CACHE_DIR", "runs/llm_cache"), mode=mode)  # type: ignore[arg-type]
+
+    # ------------------------------------------------------------------ #
+    def make_key(
+        self,
+        *,
+        model: str,
+        system_prompt: str,
+        user_text: str,
+        screenshots: List[Path | str] | None = None,
+        temperature: float = 0.0,
+        response_format: Dict[str, Any] | None = None,
+    ) -> str:
+        """Hash of the call inputs; screenshots contribute their content, not their path."""
+        material = {
+            "model": model,
+            "temperature": temperature,
+            "response_format": response_format or {},
+            "system": system_prompt.strip(),
+            "user": user_text.strip(),
+            "images": [_file_digest(p) for p in (screenshots or [])],
+        }
+        blob = json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Any | None:
+        """Return the stored response or None; honours mode and TTL."""
+        if self.mode in ("off", "record"):
+            return None
+        fp = self._path(key)
+        try:
+            age = time.time() - fp.stat().st_mtime
+            if self.ttl_s is not None and age > self.ttl_s and self.mode != "replay":
+                fp.unlink(missing_ok=True)
+                raise FileNotFoundError(fp)
+            with fp.open() as f:
+                response = json.load(f)["response"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            with self._lock:
+                self.misses += 1
+            if self.mode == "replay":
+                raise CacheMiss(f"No recorded LLM response for key {key}")
+            return None
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key: str, response: Any) -> None:
+        """Store a response (atomic rename) and evict the oldest entries past `max_entries`."""
+        if self.mode in ("off", "replay"):
+            return
+        fp = self._path(key)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp = fp.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp.open("w") as f:
+            json.dump({"created": time.time(), "response": response}, f, ensure_ascii=False)
+        os.replace(tmp, fp)
+        with self._lock:
+            self.writes += 1
+            if self.writes % 50 == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self.root.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        excess = len(entries) - self.max_entries
+        for fp in entries[:max(excess, 0)]:
+            fp.unlink(missing_ok=True)
+        if excess > 0:
+            logging.info("LLM cache evicted %d entries", excess)
+
+    # ------------------------------------------------------------------ #
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round(self.hit_rate, 3),
+        }
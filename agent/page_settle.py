@@ -0,0 +1,125 @@
+"""PageSettleDetector – wait until a page is stable instead of sleeping a fixed time."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+@dataclass
+class SettleResult:
+    waited_s: float
+    outcome: str            # "settled" | "timeout"
+    polls: int
+    last_probe: Dict[str, Any]
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["waited_s"] = round(self.waited_s, 3)
+        return d
+
+
+class PageSettleDetector:
+    """
+    Polls the page instrumentation (see `BrowserAgent.page_probe`) until:
+
+    * `document.readyState` is "complete",
+    * no fetch/XHR younger than `long_request_ms` is in flight, and no
+      resource finished for `quiet_ms` (skipped while media is playing, since
+      a stream never goes quiet),
+    * the DOM has not mutated for `quiet_ms`, or has mutated at no more than
+      `max_mutation_rate` per second over the last `quiet_ms`,
+    * and (optionally) two consecutive screenshots are identical; only
+      checked when the DOM is fully quiet and no media is playing,
+
+    or until the timeout passes.  Returns as soon as the page is stable.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Dict[str, Any]],
+        grab: Optional[Callable[[], bytes]] = None,
+        *,
+        quiet_ms: float = 500,
+        max_mutation_rate: float = 5,
+        long_request_ms: float = 3000,
+        poll_s: float = 0.1,
+        check_pixels: bool = True,
+    ) -> None:
+        self.probe = probe
+        self.grab = grab
+        self.quiet_ms = quiet_ms
+        self.max_mutation_rate = max_mutation_rate
+        self.long_request_ms = long_request_ms
+        self.poll_s = poll_s
+        self.check_pixels = check_pixels and grab is not None
+
+    def _network_quiet(self, p: Dict[str, Any]) -> bool:
+        ages = p.get("inflightAges")
+        if ages is None:
+            short = p.get("inflight", 0)
+        else:
+            short = sum(1 for age in ages if age < self.long_request_ms)
+        return short == 0 and (p.get("mediaPlaying") or p.get("sinceResource", 0) >= self.quiet_ms)
+
+    def _mutation_rate(self, history: Deque[Tuple[float, int]]) -> Optional[float]:
+        """Mutations/s over the last `quiet_ms`; None until that much history exists."""
+        (t_then, m_then), (t_now, m_now) = history[0], history[-1]
+        if (t_now - t_then) * 1000 < self.quiet_ms:
+            return None
+        return (m_now - m_then) / (t_now - t_then)
+
+    def _dom_quiet(self, p: Dict[str, Any], rate: Optional[float] = None) -> bool:
+        dom_still = p.get("sinceMutation", 0) >= self.quiet_ms
+        low_churn = rate is not None and rate <= self.max_mutation_rate
+        return (
+            p.get("readyState") == "complete"
+            and self._network_quiet(p)
+            and (dom_still or low_churn)
+        )
+
+    def wait(self, timeout: float) -> SettleResult:
+        start = time.perf_counter()
+        deadline = start + timeout
+        polls, last_probe, last_frame = 0, {}, None
+        history: Deque[Tuple[float, int]] = deque()
+
+        while True:
+            polls += 1
+            try:
+                last_probe = self.probe() or {}
+            except Exception as exc:      # navigation in progress: script context gone
+                logging.debug("settle probe failed: %s", exc)
+                last_probe = {}
+
+            rate = None
+            if last_probe:
+                now = time.perf_counter()
+                if history and last_probe.get("mutations", 0) < history[-1][1]:
+                    history.clear()      # new document: counter restarted
+                history.append((now, last_probe.get("mutations", 0)))
+                # keep the newest sample at least `quiet_ms` old as the window start
+                while len(history) > 2 and (now - history[1][0]) * 1000 >= self.quiet_ms:
+                    history.popleft()
+                rate = self._mutation_rate(history)
+
+            if last_probe and self._dom_quiet(last_probe, rate):
+                strict = last_probe.get("sinceMutation", 0) >= self.quiet_ms and not last_probe.get("mediaPlaying")
+                if not self.check_pixels or not strict:
+                    break
+                frame = hashlib.md5(self.grab()).digest()
+                if frame == last_frame:
+                    break
+                last_frame = frame
+            else:
+                last_frame = None
+
+            if time.perf_counter() >= deadline:
+                return SettleResult(time.perf_counter() - start, "timeout", polls, last_probe)
+            time.sleep(self.poll_s)
+
+        return SettleResult(time.perf_counter() - start, "settled", polls, last_probe)
@@ -0,0 +1,130 @@
+"""ParseStore – off-hot-path, content-addressed persistence of parser output."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+POLICIES = ("off", "sampled", "always")
+
+_STOP = object()  # sentinel that tells the writer thread to exit
+
+
+class ParseStore:
+    """
+    Persists parsed UI elements for one run under `root/<run_id>/`:
+
+        objects/<key>.json   one compact JSON file per distinct screen, where
+                             `key` is the hash of the full screenshot file
+                             (see perception.screen_hash)
+        index.jsonl          one line per perception: step, node, key, screenshot,
+                             and whether the object was stored
+
+    `policy` decides which parses are written: "off" (nothing, not even the
+    index), "sampled" (every `sample_every`-th distinct screen) or "always"
+    (the default).  Writes happen on a background thread;
+    byte-identical screens are stored once.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        root: Path = Path("parser"),
+        *,
+        policy: str = "always",
+        sample_every: int = 10,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown parse persistence policy {policy!r}; expected one of {POLICIES}")
+        self.run_id = run_id
+        self.policy = policy
+        self.sample_every = max(int(sample_every), 1)
+        self.dir = Path(root) / run_id
+        self._seen: Dict[str, bool] = {}    # key → stored?
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        if policy != "off":
+            (self.dir / "objects").mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name=f"parsestore-{run_id}", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_env(cls, run_id: str, **kwargs: Any) -> "ParseStore":
+        """Policy from PARSER_PERSIST (off|sampled|always), rate from PARSER_SAMPLE_EVERY."""
+        kwargs.setdefault("policy", os.getenv("PARSER_PERSIST", "always").lower())
+        kwargs.setdefault("sample_every", int(os.getenv("PARSER_SAMPLE_EVERY", "10")))
+        return cls(run_id, **kwargs)
+
+    def record(
+        self,
+        step_idx: int,
+        key: str,
+        elements: List[Dict[str, Any]],
+        *,
+        node: str = "",
+        img: Path | str | None = None,
+    ) -> None:
+        """Link `step_idx` to the parse of screen `key`; returns immediately."""
+        if self.policy == "off":
+            return
+        stored = self._seen.get(key)
+        write = False
+        if stored is None:
+            write = self.policy == "always" or len(self._seen) % self.sample_every == 0
+            self._seen[key] = stored = write
+        self._queue.put((
+            {
+                "ts": round(time.time(), 3),
+                "step_idx": step_idx,
+                "node": node,
+                "key": key,
+                "img": str(img) if img else None,
+                "stored": stored,
+            },
+            elements if write else None,
+        ))
+
+    def load(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Elements stored for `key`, or None if that screen was not persisted."""
+        fp = self.dir / "objects" / f"{key}.json"
+        if not fp.exists():
+            return None
+        with fp.open(encoding="utf-8") as f:
+            return json.load(f)["elements"]
+
+    def _run(self) -> None:
+        with (self.dir / "index.jsonl").open("a", encoding="utf-8") as index:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                entry, elements = item
+                try:
+                    if elements is not None:
+                        self._write_object(entry["key"], elements)
+                    index.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                    if self._queue.empty():
+                        index.flush()
+                except Exception as exc:     # persistence must never break a run
+                    logging.warning("ParseStore write failed: %s", exc)
+
+    def _write_object(self, key: str, elements: List[Dict[str, Any]]) -> None:
+        fp = self.dir / "objects" / f"{key}.json"
+        if fp.exists():
+            return
+        tmp = fp.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"elements": elements}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, fp)                  # readers never see a half-written object
+
+    def close(self) -> None:
+        """Write everything queued so far and stop the writer. Safe to call more than once."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
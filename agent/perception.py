@@ -0,0 +1,169 @@
+"""PerceptionManager – tracks which screenshot/parse matches the live page."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from .browser_agent import BrowserAgent
+from .dom_perception import extract_dom_elements, fuse
+
+
+def screen_hash(img_path: Path | str) -> str:
+    """
+    Hash of the full screenshot file. Any changed pixel changes it, so a match
+    means the parse is still valid (a thumbnail would miss typed text or a
+    ticked checkbox).
+    """
+    return hashlib.blake2b(Path(img_path).read_bytes(), digest_size=16).hexdigest()
+
+
+@dataclass
+class Perception:
+    img: Path
+    elements: List[Dict[str, Any]]
+    url: str = ""
+    doc_id: str = ""
+    mutations: int = 0
+    epoch: int = 0
+    screen_hash: str = ""
+    frame_hash: str = ""
+
+
+@dataclass
+class PerceptionManager:
+    """
+    Returns the screenshot and parsed elements for the page as it is *now*,
+    re-using the previous capture when nothing has changed:
+
+    1. Same browser epoch, URL, document, DOM mutation count and a cheap
+       low-quality frame hash → reuse without a full screenshot. The frame
+       hash catches changes the DOM does not see (video, canvas, transitions,
+       scrolling the page did not initiate).
+    2. Otherwise take a screenshot; if it is byte-identical to the previous
+       one → reuse the parse.
+    3. Otherwise parse, per `mode`:
+       vision – OmniParser on the screenshot.
+       dom    – interactive elements from the DOM only. No parser reads the
+                pixels, so the screenshot is captured directly as JPEG
+                (`jpeg_quality`), the form it is uploaded to the LLM in.
+       hybrid – DOM elements; OmniParser only on crops of the canvas/iframe
+                regions, or on the whole screen when DOM coverage is poor
+                (fewer than `min_dom_elements`, or opaque regions over
+                `max_opaque_ratio`).
+    """
+
+    browser: BrowserAgent
+    mode: str = "vision"
+    min_dom_elements: int = 3
+    max_opaque_ratio: float = 0.5
+    jpeg_quality: int = 80
+    current: Optional[Perception] = None
+    stats: Dict[str, int] = field(
+        default_factory=lambda: {"reused": 0, "reused_parse": 0, "parsed": 0, "dom": 0, "vision": 0}
+    )
+
+    def _probe(self) -> Dict[str, Any]:
+        try:
+            return self.browser.page_probe() or {}
+        except Exception as exc:      # e.g. page mid-navigation
+            logging.debug("page_probe failed: %s", exc)
+            return {}
+
+    def _frame_hash(self) -> str:
+        try:
+            frame = self.browser._grab_for_stability()
+        except Exception as exc:
+            logging.debug("frame grab failed: %s", exc)
+            return ""
+        return hashlib.blake2b(frame, digest_size=16).hexdigest()
+
+    def _screenshot(self) -> Path:
+        # OmniParser (vision, hybrid) expects PNG; dom mode only sends the image to the LLM
+        if self.mode == "dom":
+            try:
+                return self.browser.take_screenshot("jpeg", quality=self.jpeg_quality)
+            except ValueError:         # CDP unavailable: WebDriver only captures PNG
+                pass
+        return self.browser.take_screenshot()
+
+    def perceive(self, *, force: bool = False) -> Perception:
+        probe = self._probe()
+        epoch = self.browser.context["epoch"]
+        cur = self.current
+        frame = self._frame_hash()
+
+        if (
+            cur is not None and not force and probe
+            and cur.epoch == epoch
+            and cur.url == probe.get("url")
+            and cur.doc_id == probe.get("docId")
+            and cur.mutations == probe.get("mutations")
+            and frame and cur.frame_hash == frame
+        ):
+            self.stats["reused"] += 1
+            return cur
+
+        img = self._screenshot()
+        shash = screen_hash(img)
+        if cur is not None and not force and shash == cur.screen_hash:
+            self.stats["reused_parse"] += 1
+            elements = cur.elements
+        else:
+            self.stats["parsed"] += 1
+            elements = self._parse(img)
+
+        self.current = Perception(
+            img=img,
+            elements=elements,
+            url=probe.get("url", ""),
+            doc_id=probe.get("docId", ""),
+            mutations=probe.get("mutations", 0),
+            epoch=epoch,
+            screen_hash=shash,
+            frame_hash=frame,
+        )
+        logging.info("Perception stats: %s", self.stats)
+        return self.current
+
+    def _vision(self, img: Path) -> List[Dict[str, Any]]:
+        self.stats["vision"] += 1
+        return self.browser._run_omniparser(img).get("elements", [])
+
+    def _vision_regions(self, img: Path, regions: List[List[float]]) -> List[Dict[str, Any]]:
+        """OmniParser on a crop of each normalised region, with bboxes mapped back to the full screen."""
+        found: List[Dict[str, Any]] = []
+        with Image.open(img) as full:
+            W, H = full.size
+            for k, (x0, y0, x1, y1) in enumerate(regions):
+                box = (int(x0 * W), int(y0 * H), math.ceil(x1 * W), math.ceil(y1 * H))
+                crop = img.with_name(f"{img.stem}_region{k}.png")
+                full.crop(box).save(crop)
+                for e in self._vision(crop):
+                    bx0, by0, bx1, by1 = e["bbox"]
+                    rw, rh = x1 - x0, y1 - y0
+                    found.append({**e, "bbox": [x0 + bx0 * rw, y0 + by0 * rh, x0 + bx1 * rw, y0 + by1 * rh]})
+        return found
+
+    def _parse(self, img: Path) -> List[Dict[str, Any]]:
+        if self.mode == "vision":
+            return self._vision(img)
+        try:
+            dom = extract_dom_elements(self.browser.driver)
+        except Exception as exc:
+            logging.warning("DOM extraction failed (%s); using vision", exc)
+            return self._vision(img)
+        self.stats["dom"] += 1
+        if self.mode == "dom":
+            return fuse(dom, None)
+        if len(dom["elements"]) < self.min_dom_elements or dom["opaque_ratio"] > self.max_opaque_ratio:
+            logging.info("DOM coverage poor (%d elements, %.0f%% opaque); using vision",
+                         len(dom["elements"]), dom["opaque_ratio"] * 100)
+            return self._vision(img)
+        return fuse(dom, self._vision_regions(img, dom["opaque"]) if dom["opaque"] else None)
@@ -0,0 +1,139 @@
+# batch_runner.py
+
+from __future__ import annotations
+import json, pathlib, argparse, shutil, tempfile, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+# ───────── project imports ─────────
+from agent.graph_builder import new_context
+from main import run, new_run_id
+from run_logger import RUNS_DIR
+
+# ───────── helpers ─────────────────
+
+def load_tasks(path: str | pathlib.Path) -> List[Dict[str, Any]]:
+    """
+    Reads a JSONL file of tasks, one object per line with `app_name`, `task`
+    and `url` keys (blank lines are skipped).
+
+    Parameters:
+        path (str | Path): Path to the JSONL file.
+
+    Returns:
+        List[Dict[str, Any]]: The task specs, in file order.
+
+    Raises:
+        ValueError: If a line is missing a required key.
+    """
+    tasks = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            spec = json.loads(line)
+            missing = {"task", "url"} - spec.keys()
+            if missing:
+                raise ValueError(f"{path}:{lineno} missing keys {sorted(missing)}")
+            spec.setdefault("app_name", "")
+            tasks.append(spec)
+    return tasks
+
+
+def _run_one(idx: int, spec: Dict[str, Any], batch_id: str, browser_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs one task in its own browser session (fresh Chrome profile, own
+    screenshot dir, own log/checkpoint files) and returns a summary row.
+    """
+    run_id = f"{batch_id}-{idx:03d}"
+    profile = tempfile.mkdtemp(prefix=f"chrome-{run_id}-")
+    ctx = new_context(browser_config | {
+        "screenshot_dir": f"./screenshots/{run_id}",
+        "user_data_dir": profile,
+    })
+    t0 = time.perf_counter()
+    status, error = "fail", None
+    try:
+        _, state = run(spec["app_name"], spec["task"], spec["url"], run_id=run_id, ctx=ctx)
+        status = state.status
+        steps = state.step_idx
+    except Exception as exc:          # one bad task must not stop the batch
+        error, steps = str(exc), 0
+    finally:
+        ctx.browser.close()
+        shutil.rmtree(profile, ignore_errors=True)
+    return {
+        "run_id": run_id,
+        "task": spec["task"],
+        "status": status,
+        "steps": steps,
+        "seconds": round(time.perf_counter() - t0, 2),
+        "error": error,
+    }
+
+
+# ───────── main routine ────────────
+
+def run_batch(
+    tasks: List[Dict[str, Any]],
+    workers: int = 4,
+    browser_config: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """
+    Executes `tasks` with up to `workers` runs in flight.  Runs share the LLM
+    agents and the OmniParser models; each gets its own BrowserAgent.
+
+    Parameters:
+        tasks (List[Dict]): Task specs as returned by `load_tasks`.
+        workers (int): Number of concurrent runs / browser sessions.
+        browser_config (Dict, optional): Extra BrowserAgent config for every session.
+
+    Returns:
+        Dict[str, Any]: Aggregate summary (also written to runs/batch_<id>.json).
+    """
+    batch_id = new_run_id()
+    t0 = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="run") as pool:
+        futures = [pool.submit(_run_one, i, spec, batch_id, browser_config or {}) for i, spec in enumerate(tasks)]
+        for fut in as_completed(futures):
+            row = fut.result()
+            results.append(row)
+            print(f"[batch {batch_id}] {row['run_id']}  status={row['status']:<14} {row['seconds']:>7.1f}s  "
+                  f"({len(results)}/{len(tasks)})")
+
+    elapsed = time.perf_counter() - t0
+    durations = sorted(r["seconds"] for r in results)
+    summary = {
+        "batch_id": batch_id,
+        "workers": workers,
+        "tasks": len(tasks),
+        "done": sum(r["status"] == "done" for r in results),
+        "wall_seconds": round(elapsed, 2),
+        "tasks_per_hour": round(len(results) / elapsed * 3600, 1) if elapsed else 0.0,
+        "median_task_seconds": durations[len(durations) // 2] if durations else 0.0,
+        "results": sorted(results, key=lambda r: r["run_id"]),
+    }
+    fp = RUNS_DIR / f"batch_{batch_id}.json"
+    with fp.open("w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n[batch {batch_id}] {summary['done']}/{summary['tasks']} done in {summary['wall_seconds']}s "
+          f"→ {summary['tasks_per_hour']} tasks/hour")
+    print(f"Saved summary to {fp}")
+    return summary
+
+
+# ───────── CLI entry-point ─────────
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run many workflow tasks concurrently, one browser session per run"
+    )
+    parser.add_argument("tasks", help="JSONL file with one {app_name, task, url} object per line")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent runs")
+    parser.add_argument("--headless", action="store_true", help="Run every browser session headless")
+    args = parser.parse_args()
+
+    run_batch(load_tasks(args.tasks), workers=args.workers,
+              browser_config={"headless": True} if args.headless else None)
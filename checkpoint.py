@@ -0,0 +1,192 @@
+from pathlib import Path
+import json, os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from run_logger import RUNS_DIR
+
+_SEP = (",", ":")  # compact JSON
+
+
+class CheckpointStore:
+    """
+    Incremental checkpoint log for one run (`runs/<run_id>.ckpt.jsonl`).
+
+    Each `save()` appends one line holding only the top-level state fields that
+    changed since the previous save.  Every `snapshot_every` saves a full
+    snapshot line is written instead, which bounds the work needed to rebuild
+    a state; the previous snapshot (unless it is the first one) is then turned
+    into a delta by rewriting only the segment that starts at it, so the log
+    never holds more than two full copies of the state and each save costs
+    O(segment), not O(log).  `load()` rebuilds the latest state or the state
+    as of any earlier save or plan step.
+    """
+
+    def __init__(self, run_id: str, runs_dir: Path = RUNS_DIR, *, snapshot_every: int = 20) -> None:
+        self.run_id = run_id
+        self.path = runs_dir / f"{run_id}.ckpt.jsonl"
+        self.snapshot_every = snapshot_every
+        self._last: Optional[Dict[str, Any]] = None
+        self._seq = 0
+        self._since_snapshot = 0
+        self._snap_offset = 0                          # byte offset of the latest snapshot line
+        self._before_snap: Optional[Dict[str, Any]] = None  # state just before it; None for the first snapshot
+        if self.path.exists():
+            self._resume()   # continuing an existing run (e.g. resume): pick up where it stopped
+
+    def _resume(self) -> None:
+        """Rebuild the append position from the log, dropping a torn final line."""
+        offsets, records, good_end = [], [], 0
+        for offset, end, record in self._scan():
+            offsets.append(offset)
+            records.append(record)
+            good_end = end
+        if self.path.stat().st_size > good_end:
+            # torn final line after a crash: drop it so new appends start on a clean line
+            with self.path.open("r+b") as f:
+                f.truncate(good_end)
+        if records:
+            snap = max(i for i, r in enumerate(records) if r["kind"] == "snapshot")
+            self._last = self._rebuild(records, len(records) - 1)
+            self._seq = records[-1]["seq"] + 1
+            self._since_snapshot = len(records) - 1 - snap
+            self._snap_offset = offsets[snap]
+            self._before_snap = self._rebuild(records, snap - 1) if snap > 0 else None
+
+    # ------------------------------------------------------------------ #
+    def save(self, state: Dict[str, Any], *, node: str = "") -> None:
+        """
+        Append the changes in `state` (a JSON-ready dict) since the last save.
+        `node` names the workflow node that produced the state; resume only
+        trusts states saved at a step boundary (see `load`).
+        """
+        meta = {"seq": self._seq, "step_idx": state.get("step_idx"), "node": node}
+        snapshot = self._last is None or self._since_snapshot + 1 >= self.snapshot_every
+        if snapshot:
+            record = {**meta, "kind": "snapshot", "state": state}
+        else:
+            delta = {k: v for k, v in state.items() if self._last.get(k) != v}
+            if not delta and not node:
+                return
+            record = {**meta, "kind": "delta", "delta": delta}
+        with self.path.open("ab") as f:
+            offset = f.tell()
+            f.write((json.dumps(record, separators=_SEP, ensure_ascii=False) + "\n").encode("utf-8"))
+        if snapshot:
+            prev_offset, prev_base = self._snap_offset, self._before_snap
+            self._snap_offset, self._before_snap = offset, self._last
+            self._since_snapshot = 0
+            if prev_base is not None:
+                self._demote_snapshot(prev_offset, prev_base)   # the previous snapshot is now redundant
+        else:
+            self._since_snapshot += 1
+        self._last = state
+        self._seq += 1
+
+    def _demote_snapshot(self, offset: int, base: Dict[str, Any]) -> None:
+        """Replace the snapshot line at `offset` with a delta against `base`, rewriting only from there on."""
+        with self.path.open("r+b") as f:
+            f.seek(offset)
+            first, rest = f.readline(), f.read()
+            r = json.loads(first)
+            meta = {k: v for k, v in r.items() if k not in ("kind", "state")}
+            delta = {k: v for k, v in r["state"].items() if base.get(k) != v}
+            line = (json.dumps({**meta, "kind": "delta", "delta": delta}, separators=_SEP, ensure_ascii=False) + "\n").encode("utf-8")
+            f.seek(offset)
+            f.write(line + rest)
+            f.truncate()
+        self._snap_offset -= len(first) - len(line)
+
+    def compact(self) -> None:
+        """
+        Rewrite the whole log without redundant full copies of the state.
+
+        Every snapshot except the first and the last is replaced by a delta
+        against the state before it, so every save can still be rebuilt (for
+        resume or replay) while the log holds at most two full states.  `save`
+        keeps the log in this form on its own; this is for logs written
+        by other means.
+        """
+        if not self.path.exists():
+            return
+        records = list(self._records())
+        snapshots = [i for i, r in enumerate(records) if r["kind"] == "snapshot"]
+        if len(snapshots) <= 2:
+            return
+        prev: Dict[str, Any] = {}
+        out = []
+        for i, r in enumerate(records):
+            if r["kind"] == "snapshot":
+                state = r["state"]
+                if i not in (snapshots[0], snapshots[-1]):
+                    meta = {k: v for k, v in r.items() if k not in ("kind", "state")}
+                    r = {**meta, "kind": "delta", "delta": {k: v for k, v in state.items() if prev.get(k) != v}}
+                prev = dict(state)
+            else:
+                prev.update(r["delta"])
+            out.append(r)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            f.writelines(json.dumps(r, separators=_SEP, ensure_ascii=False) + "\n" for r in out)
+        os.replace(tmp, self.path)
+        self._resume()   # the rewrite moved the latest snapshot
+
+    # ------------------------------------------------------------------ #
+    def _scan(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """Yield (start offset, end offset, record) for each complete, valid line."""
+        offset = 0
+        with self.path.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return  # torn final line after a crash; everything before it is valid
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    return
+                yield offset, offset + len(line), record
+                offset += len(line)
+
+    def _records(self) -> Iterator[Dict[str, Any]]:
+        for _, _, record in self._scan():
+            yield record
+
+    @staticmethod
+    def _rebuild(records: List[Dict[str, Any]], upto: int) -> Dict[str, Any]:
+        start = max(i for i in range(upto + 1) if records[i]["kind"] == "snapshot")
+        state = dict(records[start]["state"])
+        for r in records[start + 1: upto + 1]:
+            state.update(r["delta"])
+        return state
+
+    def load(
+        self,
+        *,
+        seq: Optional[int] = None,
+        step_idx: Optional[int] = None,
+        node: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Rebuild a saved state.
+
+        Parameters:
+            seq (int, optional): Save number to rebuild (0-based).
+            step_idx (int, optional): Rebuild the last save made while on this plan step.
+            node (str, optional): Only consider saves made at this workflow node
+                (e.g. "update_state" for the last completed step).
+            With none of these, the latest state is returned.
+
+        Raises:
+            FileNotFoundError: If the run has no checkpoint log.
+            KeyError: If no save matches `seq` / `step_idx`.
+        """
+        records = list(self._records())
+        if not records:
+            raise FileNotFoundError(self.path)
+        matches = [
+            i for i, r in enumerate(records)
+            if (seq is None or r["seq"] == seq)
+            and (step_idx is None or r["step_idx"] == step_idx)
+            and (node is None or r.get("node") == node)
+        ]
+        if not matches:
+            raise KeyError(f"No checkpoint for seq={seq} step_idx={step_idx} node={node} in {self.path}")
+        return self._rebuild(records, matches[-1])
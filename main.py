@@ -1,19 +1,18 @@
 # main.py
 
 from __future__ import annotations
-import json, pathlib, argparse, datetime as dt
+import json, argparse, datetime as dt
 from typing import Tuple
 
 # ───────── project imports ─────────
-from agent.graph_builder import workflow, CycleState, browser  
-from agent.browser_agent import BrowserAgent 
-from run_logger import init_run, log_agent, RUNS_DIR
+from agent.graph_builder import workflow, CycleState, WorkflowContext, build_workflow, default_context, llm_cache
+from agent.browser_agent import BrowserAgent, HEADLESS_RENDERING
+from agent.parse_store import ParseStore
+from run_logger import init_run, close_run, log_agent, RUNS_DIR
+from checkpoint import CheckpointStore
 
 # ───────── helpers ─────────────────
 
-RUNS_DIR = pathlib.Path("runs")
-RUNS_DIR.mkdir(exist_ok=True)  # Ensure the runs directory exists
-
 def new_run_id() -> str:
     """
     Generates a unique run identifier based on current date and time.
@@ -39,14 +38,32 @@ def log_event(run_id: str, node: str, state: CycleState) -> None:
           f"retries={state.retries}")
 
 
+_checkpoints: dict[str, CheckpointStore] = {}
+
 def persist_state(run_id: str, state: CycleState) -> None:
     """
-    Saves the current state of the workflow to disk as a JSON file.
+    Appends the fields of the workflow state that changed since the last call
+    to the run's checkpoint log (`runs/<run_id>.ckpt.jsonl`), tagged with the
+    node that produced the state (`state.last_node`).
 
     Parameters:
         run_id (str): The run identifier used to name the file.
         state (CycleState): The current state to persist.
     """
+    store = _checkpoints.get(run_id)
+    if store is None:
+        store = _checkpoints[run_id] = CheckpointStore(run_id, RUNS_DIR)
+    store.save(state.model_dump(mode="json"), node=state.last_node or "start")
+
+
+def write_trace(run_id: str, state: CycleState) -> None:
+    """
+    Saves the final state of the workflow to disk as a JSON file.
+
+    Parameters:
+        run_id (str): The run identifier used to name the file.
+        state (CycleState): The final state to write.
+    """
     fp = RUNS_DIR / f"{run_id}.json"
     with fp.open("w") as f:
         json.dump(state.model_dump(mode="json"), f, indent=2)
@@ -54,33 +71,28 @@ def persist_state(run_id: str, state: CycleState) -> None:
 
 # ───────── main routine ────────────
 
-def run(app_name: str, task: str, url: str) -> Tuple[str, CycleState]:
+def _drive(run_id: str, init_state: CycleState, url: str, ctx: WorkflowContext | None = None) -> CycleState:
     """
-    Runs the multi-agent workflow starting from the provided URL and task.
-
-    Parameters:
-        app_name (str): Name of the application being tested or controlled.
-        task (str): Natural language task to guide the workflow.
-        url (str): URL to initialize the BrowserAgent.
-
-    Returns:
-        Tuple[str, CycleState]: The run ID and final state after execution.
+    Opens the browser at `url` and streams `init_state` through the workflow,
+    checkpointing at every update_state.  Returns the last state seen.
+    `ctx` defaults to the module-level single-run context.
     """
-    run_id = new_run_id()     # Create a unique identifier for this run
-    init_run(run_id)          # Initialize the global RUN_ID
-
+    state = init_state
+    if ctx is None:
+        ctx, graph = default_context, workflow
+    else:
+        graph = build_workflow(ctx)
+    browser = ctx.browser
+    ctx.parse_store = ParseStore.from_env(run_id)    # per-step parser output, written off the hot path
     try:
         browser.open(url)     # Launch browser to the target URL
         print(f"[main] BrowserAgent id: {id(browser)} | driver is None? {browser.driver is None}")
         print(f"[{run_id}] Navigated to {url}")
 
-        # Initialize the cycle state
-        init_state = CycleState(run_id=run_id, app_name=app_name, task=task)
-
         # Stream through the workflow graph
-        for state_dict in workflow.stream(init_state, stream_mode="values"):
+        for state_dict in graph.stream(init_state, stream_mode="values"):
             state = CycleState(**state_dict)                    # Reconstruct the Pydantic model from dict
-            node  = state_dict.get("_last_node") or "?"         # Fallback if node name is not found
+            node  = state.last_node or "?"                      # Fallback for the initial input
             log_event(run_id, node, state)                      # Log progress to stdout
 
             # Persist state snapshot at the update_state node
@@ -95,13 +107,92 @@ def run(app_name: str, task: str, url: str) -> Tuple[str, CycleState]:
 
     finally:
         # Persist last known state even if an error occurred
-        if "state" in locals():
-            persist_state(run_id, state)
-            # log_agent(run_id, state.step_idx, state.action)
+        persist_state(run_id, state)
+        write_trace(run_id, state)
+        close_run()           # drain the background log writer
+        ctx.parse_store.close()
+        _checkpoints.pop(run_id, None)
 
     print(f"\n[{run_id}] Finished with status = {state.status}")
     print(f"Saved trace to {RUNS_DIR / (run_id + '.json')}")
-    return run_id, state
+    if llm_cache is not None:
+        print(f"LLM cache: {llm_cache.stats()}")
+    return state
+
+
+def run(
+    app_name: str,
+    task: str,
+    url: str,
+    *,
+    run_id: str | None = None,
+    ctx: WorkflowContext | None = None,
+) -> Tuple[str, CycleState]:
+    """
+    Runs the multi-agent workflow starting from the provided URL and task.
+
+    Parameters:
+        app_name (str): Name of the application being tested or controlled.
+        task (str): Natural language task to guide the workflow.
+        url (str): URL to initialize the BrowserAgent.
+        run_id (str, optional): Identifier for the run; generated when omitted.
+        ctx (WorkflowContext, optional): Browser/agents to run with; concurrent
+            runs must each pass their own (see batch_runner.py).
+
+    Returns:
+        Tuple[str, CycleState]: The run ID and final state after execution.
+    """
+    run_id = run_id or new_run_id()     # Create a unique identifier for this run
+    init_run(run_id)                    # Initialize the RUN_ID for this thread
+
+    # Initialize the cycle state
+    init_state = CycleState(run_id=run_id, app_name=app_name, task=task, start_url=url)
+    return run_id, _drive(run_id, init_state, url, ctx)
+
+
+def resume(run_id: str) -> Tuple[str, CycleState]:
+    """
+    Continues an interrupted run from its last checkpoint.
+
+    The plan, step index and retry counters are restored from the last state
+    saved at update_state in `runs/<run_id>.ckpt.jsonl`.  Later saves (e.g.
+    the crash-time save after execute_action) are mid-step and are ignored,
+    so no step is re-run or skipped.  The browser is reopened at the recorded
+    URL and the workflow re-enters at perceive_before, so only the current
+    step is re-perceived and the existing plan is kept.  A run that never
+    completed a step starts over with the same task.
+
+    Parameters:
+        run_id (str): The run to continue.
+
+    Returns:
+        Tuple[str, CycleState]: The run ID and final state after execution.
+
+    Raises:
+        FileNotFoundError: If the run has no checkpoint log.
+    """
+    store = CheckpointStore(run_id, RUNS_DIR)
+    try:
+        state = CycleState(**store.load(node="update_state"))
+    except KeyError:
+        latest = store.load()
+        state = CycleState(**{k: latest[k] for k in ("run_id", "app_name", "task", "start_url")})
+    if state.status == "done":
+        print(f"[{run_id}] Already finished; nothing to resume.")
+        return run_id, state
+
+    # Screens from the crashed session are gone; everything else carries over.
+    state = state.model_copy(update={
+        "img_before": None, "img_after": None,
+        "ui_before": [], "ui_after": [],
+        "speculative_action": None,
+        "last_update_ts": 0.0, "last_node": "",
+    })
+    url = state.current_url or state.start_url
+    init_run(run_id)          # appends to the existing agent log
+    log_agent("main", state.step_idx, {"resumed": run_id, "status": state.status, "url": url})
+    print(f"[{run_id}] Resuming at step {state.step_idx} (status={state.status})")
+    return run_id, _drive(run_id, state, url)
 
 
 __all__ = ["log_agent"]
@@ -129,7 +220,23 @@ if __name__ == "__main__":
         help="Start URL for the BrowserAgent"
     )
 
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run Chrome headless with the fixed viewport from BrowserAgent config"
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Continue an interrupted run from its last checkpoint in runs/"
+    )
+
     args = parser.parse_args()
+    if args.headless:
+        default_context.browser.config.update(headless=True, **HEADLESS_RENDERING)
 
     # Run the full pipeline with provided arguments
-    run_id, _ = run(args.app_name, args.task, args.url)
\ No newline at end of file
+    if args.resume:
+        run_id, _ = resume(args.resume)
+    else:
+        run_id, _ = run(args.app_name, args.task, args.url)
\ No newline at end of file
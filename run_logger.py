@@ -1,30 +1,150 @@
 from pathlib import Path
-import json, datetime, os
-from typing import List, Dict, Optional, Any
+import json, datetime, os, gzip, queue, threading, atexit, logging
+from contextvars import ContextVar
+from typing import List, Dict, Optional, Any, Iterator
 
 # Directory where all run logs will be saved
 RUNS_DIR = Path("runs")
 RUNS_DIR.mkdir(exist_ok=True)  # Create directory if it doesn't already exist
 
-# Global variable to track the current run session
+# Global variable to track the most recently started run session
 RUN_ID: str | None = None
 
-def init_run(run_id: str) -> None:
+_STOP = object()  # sentinel that tells the writer thread to exit
+
+
+class RunLogger:
+    """
+    Append-only JSONL writer for one run.
+
+    Records are serialised by `write()` on the caller's thread (so a record
+    is a snapshot, even if the caller later mutates its payload) and written
+    by a background thread, so the agent never blocks on file I/O.  The file stays open for the whole run;
+    the writer flushes whenever the queue drains and fsyncs at most every
+    `fsync_interval` seconds.  With `compress=True` the log is gzip-compressed
+    (`.jsonl.gz`); `iter_records` reads both.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        runs_dir: Path = RUNS_DIR,
+        *,
+        compress: bool = False,
+        fsync_interval: float = 2.0,
+    ) -> None:
+        self.run_id = run_id
+        self.path = log_path(run_id, runs_dir, compress=compress)
+        self.fsync_interval = fsync_interval
+        self._fh = gzip.open(self.path, "at", encoding="utf-8") if compress else self.path.open("a", encoding="utf-8")
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"runlog-{run_id}", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Serialise one record and queue it for writing; returns immediately."""
+        self._queue.put(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _run(self) -> None:
+        last_sync = datetime.datetime.now().timestamp()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # drain whatever else is already queued into the same write
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(x is _STOP for x in batch)
+            lines = [line for line in batch if line is not _STOP]
+            if lines:
+                try:
+                    self._fh.write("".join(lines))
+                    self._fh.flush()
+                    now = datetime.datetime.now().timestamp()
+                    if stop or now - last_sync >= self.fsync_interval:
+                        self._fsync()
+                        last_sync = now
+                except Exception as exc:     # keep the writer alive for later records
+                    logging.error("Run log write failed for %s: %s", self.run_id, exc)
+            if stop:
+                return
+
+    def _fsync(self) -> None:
+        try:
+            os.fsync(self._fh.fileno())
+        except (OSError, AttributeError, ValueError):
+            pass  # gzip streams expose no usable fileno on some platforms
+
+    def close(self) -> None:
+        """Flush everything queued so far, fsync and close the file."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._fh.close()
+
+
+# Logger of the run executing in the current thread/context.  Concurrent runs
+# (see batch_runner.py) each call init_run in their own thread, so their
+# records never mix.  Worker threads must run in a copy of the run's context
+# (contextvars.copy_context().run); there is deliberately no process-wide
+# fallback, which would send their records to whichever run started last.
+_current: ContextVar[Optional[RunLogger]] = ContextVar("run_logger", default=None)
+_open: Dict[str, RunLogger] = {}   # every open logger, by run id
+_open_lock = threading.Lock()
+
+
+def log_path(run_id: str, runs_dir: Path = RUNS_DIR, *, compress: bool = False) -> Path:
+    """Path of the agent log for `run_id`."""
+    return runs_dir / f"{run_id}_agentlog.jsonl{'.gz' if compress else ''}"
+
+
+def init_run(run_id: str, *, compress: bool = False) -> None:
     """
-    Initializes the global run ID used to label log files for a session.
+    Initializes the run ID used to label log files for a session in the
+    current thread/context.
 
     Parameters:
         run_id (str): A unique identifier for the current run.
+        compress (bool): Write the log gzip-compressed. Defaults to False.
     """
     global RUN_ID
-    RUN_ID = run_id  # Set the global RUN_ID used for logging
+    close_run()
+    RUN_ID = run_id  # most recently started run (informational)
+    logger = RunLogger(run_id, compress=compress)
+    with _open_lock:
+        _open[run_id] = logger
+    _current.set(logger)
+
+
+def close_run() -> None:
+    """Flushes and closes the current context's run log. Safe to call more than once."""
+    logger = _current.get()
+    if logger is not None:
+        logger.close()
+        with _open_lock:
+            _open.pop(logger.run_id, None)
+        _current.set(None)
+
+
+def _close_all() -> None:
+    with _open_lock:
+        loggers = list(_open.values())
+        _open.clear()
+    for logger in loggers:
+        logger.close()
+
+
+atexit.register(_close_all)
+
 
 def log_agent(
     agent: str,
     step_idx: int,
     payload: dict | list,
-    img_before: str = None,   
-    img_after:  str = None,   
+    img_before: str = None,
+    img_after:  str = None,
 ) -> None:
     """
     Logs information about an agent's action at a specific step in a process.
@@ -37,26 +157,62 @@ def log_agent(
         img_after (str, optional): Path or reference to an image after the action (if applicable). Defaults to None.
 
     Raises:
-        RuntimeError: If RUN_ID is not initialized before logging.
+        RuntimeError: If no run was initialised in the current context.
     """
-    if RUN_ID is None:
-        raise RuntimeError("RUN_ID not initialised")  # Ensure logging only occurs after initialization
+    logger = _current.get()
+    if logger is None:
+        # Ensure logging only occurs after initialization, and never into another run's log
+        raise RuntimeError("RUN_ID not initialised in this context (call init_run, or copy the run's context)")
 
     # Prepare a record with metadata and payload
     record = {
-        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),  # Current time in ISO format
+        "timestamp": datetime.datetime.now().isoformat(timespec="milliseconds"),  # Current time in ISO format
         "agent":     agent,
         "step_idx":  step_idx,
         "payload":   payload,
         "img_before": img_before,  # optional image before action
         "img_after":  img_after,   # optional image after action
     }
+    logger.write(record)  # serialised here, written by the background thread
+
+
+def iter_records(
+    run_id: str,
+    runs_dir: Path = RUNS_DIR,
+    *,
+    agent: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the records of a run's agent log, oldest first.
+
+    Parameters:
+        run_id (str): The run whose log to read.
+        runs_dir (Path, optional): Directory holding the logs. Defaults to RUNS_DIR.
+        agent (str, optional): Only yield records from this agent.
+
+    Raises:
+        FileNotFoundError: If no log exists for `run_id`.
+    """
+    fp = log_path(run_id, runs_dir)
+    gz = log_path(run_id, runs_dir, compress=True)
+    if fp.exists():
+        fh = fp.open(encoding="utf-8")
+    elif gz.exists():
+        fh = gzip.open(gz, "rt", encoding="utf-8")
+    else:
+        raise FileNotFoundError(fp)
+    with fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line after a hard crash
+            if agent is None or record.get("agent") == agent:
+                yield record
+
 
-    # Open log file for the current run in append mode
-    fp = RUNS_DIR / f"{RUN_ID}_agentlog.jsonl"
-    with fp.open("a") as f:
-        for key, value in record.items():
-            # Write each key-value pair as JSON-encoded value
-            f.write(f"{key}: {json.dumps(value, ensure_ascii=False)}\n")
-        f.write("\n")  # Separate records by a blank line
-        f.flush()      # Ensure data is immediately written to disk (crash-safe)
\ No newline at end of file
+def read_records(run_id: str, runs_dir: Path = RUNS_DIR, **kwargs: Any) -> List[Dict[str, Any]]:
+    """Returns all records of a run's agent log as a list (see `iter_records`)."""
+    return list(iter_records(run_id, runs_dir, **kwargs))
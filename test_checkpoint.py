@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from checkpoint import CheckpointStore
+
+
+def _state(i):
+    return {"step_idx": i // 2, "status": "success" if i % 2 else "pending", "plan": ["a", "b", "c"], "n": i}
+
+
+def _kinds(store):
+    return [r["kind"] for r in store._records()]
+
+
+def test_saves_deltas_between_snapshots(tmp_path):
+    store = CheckpointStore("run", tmp_path, snapshot_every=3)
+    for i in range(4):
+        store.save(_state(i))
+
+    records = list(store._records())
+    assert _kinds(store) == ["snapshot", "delta", "delta", "snapshot"]
+    assert set(records[1]["delta"]) == {"status", "n"}
+
+
+def test_unchanged_state_is_skipped_unless_tagged(tmp_path):
+    store = CheckpointStore("run", tmp_path)
+    store.save(_state(0))
+    store.save(_state(0))
+    store.save(_state(0), node="update_state")
+    assert [r["node"] for r in store._records()] == ["", "update_state"]
+
+
+def test_only_first_and_last_snapshots_are_kept_and_every_save_rebuilds(tmp_path):
+    store = CheckpointStore("run", tmp_path, snapshot_every=3)
+    for i in range(10):
+        store.save(_state(i))
+
+    assert _kinds(store).count("snapshot") == 2
+    assert _kinds(store)[0] == "snapshot"
+    for i in range(10):
+        assert store.load(seq=i) == _state(i)
+
+
+def test_compaction_matches_a_full_rewrite(tmp_path):
+    incremental = CheckpointStore("inc", tmp_path, snapshot_every=2)
+    full = CheckpointStore("full", tmp_path, snapshot_every=10**6)
+    for i in range(9):
+        incremental.save(_state(i))
+    # the uncompacted log: a full snapshot every second save, then compact it in one go
+    with full.path.open("w") as f:
+        for r in incremental._records():
+            if r["seq"] % 2 == 0:
+                meta = {k: v for k, v in r.items() if k not in ("kind", "delta", "state")}
+                r = {**meta, "kind": "snapshot", "state": incremental.load(seq=r["seq"])}
+            f.write(json.dumps(r) + "\n")
+    full.compact()
+
+    assert list(full._records()) == list(incremental._records())
+
+
+def test_load_by_step_and_node(tmp_path):
+    store = CheckpointStore("run", tmp_path, snapshot_every=4)
+    for i in range(6):
+        store.save(_state(i), node="update_state" if i % 2 else "execute_action")
+
+    assert store.load(step_idx=1) == _state(3)
+    assert store.load(node="execute_action") == _state(4)
+    assert store.load() == _state(5)
+    with pytest.raises(KeyError):
+        store.load(step_idx=9)
+    with pytest.raises(FileNotFoundError):
+        CheckpointStore("missing", tmp_path).load()
+
+
+def test_resume_continues_sequence_and_snapshot_cadence(tmp_path):
+    first = CheckpointStore("run", tmp_path, snapshot_every=3)
+    for i in range(4):
+        first.save(_state(i))
+
+    resumed = CheckpointStore("run", tmp_path, snapshot_every=3)
+    for i in range(4, 8):
+        resumed.save(_state(i))
+
+    records = list(resumed._records())
+    assert [r["seq"] for r in records] == list(range(8))
+    assert _kinds(resumed).count("snapshot") == 2
+    assert all(resumed.load(seq=i) == _state(i) for i in range(8))
+
+
+def test_resume_drops_a_torn_last_line(tmp_path):
+    store = CheckpointStore("run", tmp_path, snapshot_every=3)
+    for i in range(2):
+        store.save(_state(i))
+    with store.path.open("a") as f:
+        f.write('{"seq":2,"step_idx":1,"node":"","kind":"del')   # crash mid-append
+
+    resumed = CheckpointStore("run", tmp_path, snapshot_every=3)
+    resumed.save(_state(2))
+    resumed.save(_state(3))
+
+    reloaded = CheckpointStore("run", tmp_path)
+    assert [r["seq"] for r in reloaded._records()] == [0, 1, 2, 3]
+    assert reloaded.load() == _state(3)
+    assert reloaded.load(seq=1) == _state(1)
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("PIL")   # agent.llm_utils.utils needs Pillow
+sys.path.insert(0, str(Path(__file__).parent / "OmniParser" / "omnitool" / "gradio"))
+
+from agent.history import CHARS_PER_TOKEN, SUMMARY_CHARS, HistoryManager  # noqa: E402
+
+
+def _images(messages):
+    return [c for m in messages for c in m["content"] if isinstance(c, str) and c.endswith(".png")]
+
+
+def test_image_ring_keeps_the_newest_screenshots():
+    history = HistoryManager(max_images=2)
+    messages = [{"role": "user", "content": ["task"]}]
+    for i in range(4):                  # the agent's order: prepare, then attach this step's screenshot
+        messages.append({"role": "user", "content": [f"step {i}"]})
+        history.prepare(messages)
+        history.add_images(messages, [f"shot{i}.png"])
+    history.prepare(messages)
+
+    assert _images(messages) == ["shot2.png", "shot3.png"]
+
+
+def test_ephemeral_images_are_dropped_at_the_next_step():
+    history = HistoryManager()
+    messages = [{"role": "user", "content": ["step 0"]}]
+    history.prepare(messages)
+    history.add_images(messages, ["shot0.png"], ephemeral=["som0.png"])
+    assert _images(messages) == ["shot0.png", "som0.png"]
+
+    messages.append({"role": "user", "content": ["step 1"]})
+    history.prepare(messages)
+    assert _images(messages) == ["shot0.png"]
+
+
+def test_som_overlays_from_the_caller_are_treated_as_ephemeral():
+    history = HistoryManager()
+    messages = [{"role": "user", "content": ["look", "screen_som.png", "screen.png"]}]
+    history.prepare(messages)
+    history.prepare(messages + [{"role": "user", "content": ["next"]}])
+    assert _images(messages) == ["screen.png"]
+
+
+def test_oldest_text_is_compacted_until_under_budget():
+    long_text = "x" * 4000
+    history = HistoryManager(token_budget=3100, keep_head=1, keep_tail=2)
+    messages = [{"role": "user", "content": ["task"]}]
+    messages += [{"role": "assistant", "content": [long_text, "shot.png"]} for _ in range(4)]
+    history.prepare(messages)
+
+    assert history.total_tokens <= 3100
+    assert messages[0]["content"] == ["task"]                         # head kept
+    assert messages[1]["content"][0].startswith("[earlier assistant, truncated]")
+    assert len(messages[1]["content"][0]) < SUMMARY_CHARS + 40
+    assert messages[1]["content"][1] == "shot.png"                    # images survive compaction
+    assert messages[2]["content"][0] == long_text                     # stopped once under budget
+    assert messages[-1]["content"][0] == long_text
+
+
+def test_tail_is_never_compacted_even_over_budget():
+    history = HistoryManager(token_budget=10, keep_head=1, keep_tail=2)
+    messages = [{"role": "user", "content": ["task"]}]
+    messages += [{"role": "assistant", "content": ["y" * 400]} for _ in range(3)]
+    history.prepare(messages)
+
+    assert messages[1]["content"][0].startswith("[earlier assistant, truncated]")
+    assert [m["content"][0] for m in messages[2:]] == ["y" * 400] * 2
+    assert history.total_tokens == sum(
+        len(c) // CHARS_PER_TOKEN for m in messages for c in m["content"] if not c.endswith(".png")
+    )
+
+
+def test_prepare_only_indexes_new_messages():
+    history = HistoryManager()
+    messages = [{"role": "user", "content": "a" * 40}]
+    history.prepare(messages)
+    history.prepare(messages)
+    assert history.total_tokens == 10
+
+    messages.append({"role": "assistant", "content": ["b" * 80]})
+    history.prepare(messages)
+    assert history.total_tokens == 30
@@ -0,0 +1,59 @@
+import pytest
+
+from agent.llm_cache import CacheMiss, LLMResponseCache
+
+
+def _key(cache, **overrides):
+    args = {"model": "m", "system_prompt": "sys", "user_text": "do it"}
+    return cache.make_key(**(args | overrides))
+
+
+def test_key_depends_on_screenshot_content_not_path(tmp_path):
+    cache = LLMResponseCache(root=tmp_path / "cache")
+    a, b, c = tmp_path / "a.png", tmp_path / "b.png", tmp_path / "c.png"
+    a.write_bytes(b"same pixels")
+    b.write_bytes(b"same pixels")
+    c.write_bytes(b"other pixels")
+
+    assert _key(cache, screenshots=[a]) == _key(cache, screenshots=[b])
+    assert _key(cache, screenshots=[a]) != _key(cache, screenshots=[c])
+
+
+def test_key_ignores_surrounding_whitespace_but_not_params(tmp_path):
+    cache = LLMResponseCache(root=tmp_path)
+    assert _key(cache, user_text="  do it\n") == _key(cache)
+    assert _key(cache, temperature=0.7) != _key(cache)
+    assert _key(cache, model="other") != _key(cache)
+
+
+def test_read_write_miss_then_hit(tmp_path):
+    cache = LLMResponseCache(root=tmp_path)
+    key = _key(cache)
+
+    assert cache.get(key) is None
+    cache.put(key, {"action": "click"})
+    assert cache.get(key) == {"action": "click"}
+    assert (cache.hits, cache.misses, cache.writes) == (1, 1, 1)
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_record_overwrites_and_replay_only_reads(tmp_path):
+    recorder = LLMResponseCache(root=tmp_path, mode="record")
+    key = _key(recorder)
+    recorder.put(key, "first")
+    assert recorder.get(key) is None          # record never serves hits
+    recorder.put(key, "second")
+
+    replay = LLMResponseCache(root=tmp_path, mode="replay")
+    assert replay.get(key) == "second"
+    replay.put(_key(replay, user_text="new"), "ignored")
+    with pytest.raises(CacheMiss):
+        replay.get(_key(replay, user_text="new"))
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMResponseCache(root=tmp_path, ttl_s=-1)
+    key = _key(cache)
+    cache.put(key, "stale")
+    assert cache.get(key) is None
+    assert not cache._path(key).exists()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from agent.parse_store import ParseStore
+
+ELEMENTS = [{"id": 0, "content": "Search", "bbox": [0.1, 0.1, 0.2, 0.2]}]
+
+
+def _index(store):
+    with (store.dir / "index.jsonl").open() as f:
+        return [json.loads(line) for line in f]
+
+
+def test_always_stores_each_distinct_screen_once(tmp_path):
+    store = ParseStore("run", tmp_path)
+    store.record(0, "aaa", ELEMENTS, node="perceive_before", img="a.png")
+    store.record(0, "aaa", ELEMENTS, node="perceive_after")
+    store.record(1, "bbb", [])
+    store.close()
+
+    assert [(e["step_idx"], e["key"], e["stored"]) for e in _index(store)] == [
+        (0, "aaa", True), (0, "aaa", True), (1, "bbb", True),
+    ]
+    assert _index(store)[0]["img"] == "a.png"
+    assert store.load("aaa") == ELEMENTS
+    assert store.load("bbb") == []
+    assert len(list((store.dir / "objects").iterdir())) == 2
+
+
+def test_sampled_stores_every_nth_distinct_screen(tmp_path):
+    store = ParseStore("run", tmp_path, policy="sampled", sample_every=3)
+    for i in range(7):
+        store.record(i, f"k{i}", ELEMENTS)
+    store.record(7, "k1", ELEMENTS)     # a repeat keeps its first decision
+    store.close()
+
+    assert [e["stored"] for e in _index(store)] == [True, False, False, True, False, False, True, False]
+    assert store.load("k3") == ELEMENTS
+    assert store.load("k1") is None
+
+
+def test_off_writes_nothing(tmp_path):
+    store = ParseStore("run", tmp_path, policy="off")
+    store.record(0, "aaa", ELEMENTS)
+    store.close()
+
+    assert not store.dir.exists()
+    assert store.load("aaa") is None
+
+
+def test_policy_from_env_and_validation(tmp_path, monkeypatch):
+    monkeypatch.setenv("PARSER_PERSIST", "SAMPLED")
+    monkeypatch.setenv("PARSER_SAMPLE_EVERY", "4")
+    store = ParseStore.from_env("run", root=tmp_path)
+    store.close()
+    assert (store.policy, store.sample_every) == ("sampled", 4)
+
+    with pytest.raises(ValueError):
+        ParseStore("run", tmp_path, policy="sometimes")
@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / "OmniParser" / "omnitool" / "gradio"))
+
+from agent.router import BudgetExceeded, ModelRouter, cost_usd  # noqa: E402
+
+SCREEN = {"parsed_content_list": [{"content": "Search"}, {"content": "OK"}, {"content": "OK"}]}
+
+
+def _router(**kwargs):
+    return ModelRouter("gpt-4o-2024-11-20", "gpt-4o-mini", **kwargs)
+
+
+@pytest.mark.parametrize("response, reason", [
+    ({"Next Action": "left_click", "Box ID": 0}, None),
+    ({"Next Action": "scroll_down"}, None),
+    ({"Next Action": "wait"}, None),
+    (None, "unparsable response"),
+    ({"Next Action": "None"}, "task completion"),
+    ({"Next Action": "left_click"}, "missing or unknown Box ID"),
+    ({"Next Action": "left_click", "Box ID": 7}, "missing or unknown Box ID"),
+    ({"Next Action": "left_click", "Box ID": -1}, "missing or unknown Box ID"),
+    ({"Next Action": "left_click", "Box ID": "x"}, "missing or unknown Box ID"),
+    ({"Next Action": "left_click", "Box ID": 1}, "ambiguous target 'OK'"),
+])
+def test_review_of_small_model_answers(response, reason):
+    assert _router().review("gpt-4o-mini", response, SCREEN) == reason
+
+
+def test_large_model_answers_are_never_escalated():
+    assert _router().review("gpt-4o-2024-11-20", None, SCREEN) is None
+
+
+def test_repeated_action_escalates_and_sends_next_step_to_large():
+    router = _router()
+    click = {"Next Action": "left_click", "Box ID": "0"}
+    assert router.choose() == "gpt-4o-mini"
+    router.accept(click)
+    assert router.review("gpt-4o-mini", click, SCREEN) == "repeated previous action"
+
+    assert router.escalate() == "gpt-4o-2024-11-20"
+    router.accept(click)                       # the large model repeated it too
+    assert router.choose() == "gpt-4o-2024-11-20"
+    router.accept({"Next Action": "wait"})
+    assert router.choose() == "gpt-4o-mini"
+    assert router.routed == {"small": 2, "large": 1, "escalated": 1}
+
+
+def test_without_small_model_every_step_goes_large():
+    router = ModelRouter("o1")
+    assert router.choose() == "o1"
+    assert router.review("o1", None, SCREEN) is None
+
+
+def test_record_accounts_cost_and_histograms():
+    router = _router()
+    cost = router.record("gpt-4o-mini", 0.7, 10_000)
+    assert cost == pytest.approx(cost_usd("gpt-4o-mini", 10_000)) == pytest.approx(0.0015)
+    router.record("gpt-4o-mini", 40, 0)
+
+    stats = router.summary()["models"]["gpt-4o-mini"]
+    assert (stats["calls"], stats["tokens"]) == (2, 10_000)
+    assert stats["latency_s"]["buckets"]["<=1"] == 1
+    assert stats["latency_s"]["buckets"][">32"] == 1
+    assert router.spent_usd == pytest.approx(0.0015)
+
+
+def test_budget_stops_escalation_then_calls():
+    router = _router(task_budget_usd=0.01, small_only_at=0.5)
+    router.record("gpt-4o-2024-11-20", 1, 2_000)          # $0.005: half the budget
+    assert router.review("gpt-4o-mini", None, SCREEN) is None   # no more escalation
+    router.accept({"Next Action": "wait"})
+    router.accept({"Next Action": "wait"})
+    assert router.choose() == "gpt-4o-mini"                 # repeat would force large, budget wins
+
+    router.record("gpt-4o-2024-11-20", 1, 2_000)
+    with pytest.raises(BudgetExceeded):
+        router.choose()